@@ -0,0 +1,163 @@
+"""
+Command-line entry point to run simulations of a scenario file (json, toml or yaml):
+    python cli.py scenario.toml
+    python cli.py scenario.json --set capacity=8 --set parameters.holding_duration=900
+    python cli.py --template > scenario.json
+    python cli.py scenario.toml --policy-module my_policies     # modes of your own departure policies
+
+Set "telemetry_path" in a scenario to record vertiports' telemetry (see telemetry.py) and "seed"
+and "cache_file" to reuse results of previous simulations (see result_cache.py).
+
+A scenario file contains the arguments of run_main and an optional "parameters" table for
+the physical constants (see DEFAULT_PARAMETERS in run_main.py). Heavy dependencies are only
+imported when they are needed, so starting this module is fast.
+"""
+import argparse
+import json
+import os
+import sys
+
+# scenario fields and their default values
+REQUIRED = 'required'
+SCENARIO_FIELDS = {'mode': REQUIRED, 'cruise_speed': REQUIRED, 'capacity': REQUIRED, 'vertiport_file_name': REQUIRED,
+                   'start_demand': REQUIRED, 'end_demand': REQUIRED, 'demand_step': 1, 'maximum_wait_time': REQUIRED,
+                   'parameters': {}, 'telemetry_path': None, 'seed': None, 'cache_file': None}
+
+
+def load_scenario(file_name: str) -> dict:
+    """
+    This function reads a scenario file. Its format is determined by its extension
+    (.json, .toml, .yaml or .yml).
+
+    Raises:
+        ValueError: if the file format is not supported.
+
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.json':
+        with open(file_name) as file:
+            return json.load(file)
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError: # python < 3.11
+            import tomli as tomllib
+        with open(file_name, 'rb') as file:
+            return tomllib.load(file)
+    if extension in ['.yaml', '.yml']:
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML is required to read yaml scenario files (pip install pyyaml)")
+        with open(file_name) as file:
+            return yaml.safe_load(file)
+    raise ValueError(f"scenario file format '{extension}' is not supported (use .json, .toml or .yaml)")
+
+
+def apply_overrides(scenario: dict, overrides: list) -> dict:
+    """
+    This function applies "key=value" overrides to a scenario. Values are parsed as json
+    when possible (otherwise they are strings) and "parameters.<name>" keys change physical constants.
+    """
+    for override in overrides:
+        key, separator, value = override.partition('=')
+        if not separator:
+            raise ValueError(f"override '{override}' is not in key=value form")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        if key.startswith('parameters.'):
+            scenario['parameters'] = {**scenario.get('parameters', {}), key[len('parameters.'):]: value}
+        else:
+            scenario[key] = value
+    return scenario
+
+
+def fill_fields(data: dict, fields: dict, kind: str) -> dict:
+    """
+    This function validates the fields of a dict (a scenario, a job, ...) and fills their default values.
+
+    Args:
+        data (dict): given fields.
+        fields (dict): all fields and their default values (REQUIRED for required fields).
+        kind (str): kind of the dict in error messages (e.g. 'scenario').
+
+    Raises:
+        ValueError: if a required field is missing or there is an unknown field.
+
+    """
+    unknown = set(data) - set(fields)
+    if unknown:
+        raise ValueError(f"unknown {kind} fields: {sorted(unknown)}")
+    out = {}
+    for field, default in fields.items():
+        if field not in data and default == REQUIRED:
+            raise ValueError(f"{kind} field '{field}' is required")
+        out[field] = data.get(field, default)
+    return out
+
+
+def create_scenario(data: dict) -> dict:
+    """
+    This function validates a scenario and fills its default values.
+
+    Raises:
+        ValueError: if a required field is missing or there is an unknown field, mode or parameter.
+
+    """
+    from departure_policies import resolve_departure_policy
+    from run_main import create_parameters
+    scenario = fill_fields(data, SCENARIO_FIELDS, 'scenario')
+    # modes are names of registered departure policies (see departure_policies.py)
+    resolve_departure_policy(scenario['mode'])
+    scenario['parameters'] = create_parameters(scenario['parameters'])
+    return scenario
+
+
+def create_template() -> dict:
+    """
+    This function creates a scenario with the values of main.py and all default parameters.
+    """
+    from run_main import DEFAULT_PARAMETERS
+    return {'mode': 'station_wait', 'cruise_speed': 120, 'capacity': 12, 'vertiport_file_name': 'vertiport_info_144_12',
+            'start_demand': 800, 'end_demand': 820, 'demand_step': 20, 'maximum_wait_time': 1200,
+            'parameters': dict(DEFAULT_PARAMETERS), 'telemetry_path': None, 'seed': None, 'cache_file': None}
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='run UAM network simulations of a scenario file')
+    parser.add_argument('scenario', nargs='?', help='scenario file (.json, .toml, .yaml or .yml)')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a scenario field or a parameter (parameters.<name>=value)')
+    parser.add_argument('--template', action='store_true', help='print a json scenario template and exit')
+    parser.add_argument('--dry-run', action='store_true', help='validate and print the scenario without running it')
+    parser.add_argument('--policy-module', action='append', default=[],
+                        help='module that registers departure policies (see departure_policies.py)')
+    args = parser.parse_args(argv)
+    if args.template:
+        print(json.dumps(create_template(), indent=4))
+        return 0
+    if args.scenario is None:
+        parser.error('a scenario file is required')
+    try:
+        from departure_policies import import_policy_modules
+        import_policy_modules(args.policy_module)
+        scenario = create_scenario(apply_overrides(load_scenario(args.scenario), args.overrides))
+    except (OSError, ImportError, ValueError) as error:
+        parser.error(str(error))
+    if args.dry_run:
+        print(json.dumps(scenario, indent=4))
+        return 0
+    from run_main import run_main
+    from result_cache import ResultCache
+    cache = ResultCache(scenario['cache_file']) if scenario['cache_file'] else None
+    run_main(scenario['mode'], scenario['cruise_speed'], scenario['capacity'], scenario['vertiport_file_name'],
+             scenario['start_demand'], scenario['end_demand'], scenario['demand_step'], scenario['maximum_wait_time'],
+             parameters=scenario['parameters'], telemetry_path=scenario['telemetry_path'], seed=scenario['seed'],
+             cache=cache)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
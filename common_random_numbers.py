@@ -0,0 +1,191 @@
+"""
+Common random numbers for comparing configurations (modes, cruise speeds, capacities, ...). Every
+replication has its own seeded random streams (created from one seed by np.random.SeedSequence) and
+the same streams are used for every configuration, so the differences between configurations in a
+replication are not hidden by different random demands. Paired differences of KPIs need much less
+replications than independent runs to find the better configuration:
+
+    results = run_replications([{'mode': 'wait', ...}, {'mode': 'station_wait', ...}], demand_number=800,
+                               replications=10, seed=1)
+    compare_configurations(results, 'satisfied_demands')
+
+or from a file (json, toml or yaml, see crn_example.toml):
+    python common_random_numbers.py crn_example.toml
+    python common_random_numbers.py crn_example.toml --policy-module my_policies  # modes of your own policies
+
+Configurations get the same demands when they have the same vertiports (the same number of vertiports
+in the same order), because demands are drawn by vertiport indexes.
+"""
+import argparse
+import math
+import sys
+import numpy as np
+from copy import deepcopy
+
+from cli import REQUIRED, fill_fields, load_scenario
+from create_objects import create_vertiport
+from departure_policies import import_policy_modules, resolve_departure_policy
+from run_main import create_parameters, create_aircraft_info, load_max_station_time_data, simulate_demand
+from utility import t_quantile_95
+
+# random inputs of a simulation (new inputs should be appended, so streams of older ones do not change)
+STREAMS = ['demands']
+# configuration fields and their default values
+CONFIGURATION_FIELDS = {'vertiport_file_name': REQUIRED, 'mode': REQUIRED, 'cruise_speed': REQUIRED,
+                        'capacity': REQUIRED, 'maximum_wait_time': REQUIRED, 'parameters': {}}
+DEFAULT_KPIS = ['satisfied_demands', 'cost_per_demand', 'mean_flight_delay']
+
+
+def replication_seeds(seed: int, replications: int) -> list:
+    """
+    This function creates independent seeds (np.random.SeedSequence) of replications from one seed.
+    """
+    return np.random.SeedSequence(seed).spawn(replications)
+
+
+def stream_rng(seed_sequence: np.random.SeedSequence, stream: str = 'demands') -> np.random.Generator:
+    """
+    This function creates a new random generator of a random input (one of STREAMS) of a replication.
+    Generators of the same replication and stream always produce the same numbers.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed_sequence.entropy,
+                                                        spawn_key=seed_sequence.spawn_key + (STREAMS.index(stream),)))
+
+
+def create_configuration(data: dict) -> dict:
+    """
+    This function validates a configuration and fills its default values.
+
+    Raises:
+        ValueError: if a required field is missing or there is an unknown field, mode or parameter.
+
+    """
+    configuration = fill_fields(data, CONFIGURATION_FIELDS, 'configuration')
+    # modes are names of registered departure policies (see departure_policies.py)
+    resolve_departure_policy(configuration['mode'])
+    configuration['parameters'] = create_parameters(configuration['parameters'])
+    return configuration
+
+
+def run_replications(configurations: list, demand_number: int, replications: int, seed: int = 0) -> list:
+    """
+    This function runs every configuration with the same random streams in every replication.
+
+    Args:
+        configurations (list): list of configuration dicts (see CONFIGURATION_FIELDS).
+        demand_number (int): number of demands.
+        replications (int): number of replications.
+        seed (int): seed of all replications.
+
+    Returns:
+        results (list): KPIs (see calc_kpis in run_main.py) of every replication of every configuration
+                        in this form: results[configuration index][replication index].
+
+    """
+    configurations = [create_configuration(configuration) for configuration in configurations]
+    seeds = replication_seeds(seed, replications)
+    max_station_time_data = {}
+    results = []
+    for configuration in configurations:
+        parameters = configuration['parameters']
+        if parameters['max_station_time_file'] not in max_station_time_data:
+            max_station_time_data[parameters['max_station_time_file']] = load_max_station_time_data(parameters['max_station_time_file'])
+        aircraft_info = create_aircraft_info(configuration['cruise_speed'], configuration['capacity'], parameters)
+        vertiports, last_id = create_vertiport(configuration['vertiport_file_name'], aircraft_info)
+        configuration_results = []
+        for seed_sequence in seeds:
+            kpis = simulate_demand(configuration['mode'], configuration['cruise_speed'], configuration['capacity'],
+                                   deepcopy(vertiports), last_id, demand_number, configuration['maximum_wait_time'],
+                                   max_station_time_data[parameters['max_station_time_file']], keep_objects=False,
+                                   parameters=parameters, rng=stream_rng(seed_sequence))
+            del kpis['demands'], kpis['vertiports']
+            configuration_results.append(kpis)
+        results.append(configuration_results)
+    return results
+
+
+def paired_difference(kpis_1: list, kpis_2: list, kpi: str) -> dict:
+    """
+    This function calculates statistics of the paired differences (second minus first) of a KPI in
+    replications of two configurations. Replications that have failed in any of them are skipped.
+
+    Args:
+        kpis_1 (list): KPIs of replications of the first configuration.
+        kpis_2 (list): KPIs of replications of the second configuration (in the same order).
+        kpi (str): name of the KPI.
+
+    Returns:
+        statistics (dict): kpi, replications, mean_difference, std, stderr, ci_95 (95% confidence
+            interval of mean_difference), t, significant (ci_95 does not contain zero) and
+            variance_reduction (variance of mean difference of independent runs divided by
+            variance of mean paired difference: about how many times more runs independent
+            replications need for the same confidence).
+
+    Raises:
+        ValueError: if there are less than two replications that have not failed.
+
+    """
+    pairs = [(kpis_a[kpi], kpis_b[kpi]) for kpis_a, kpis_b in zip(kpis_1, kpis_2)
+             if kpis_a[kpi] is not None and kpis_b[kpi] is not None
+             and not math.isnan(kpis_a[kpi]) and not math.isnan(kpis_b[kpi])]
+    if len(pairs) < 2:
+        raise ValueError(f"at least two replications are needed to compare '{kpi}'")
+    values = np.array(pairs, dtype=float)
+    differences = values[:, 1] - values[:, 0]
+    replications = len(differences)
+    mean_difference = float(differences.mean())
+    std = float(differences.std(ddof=1))
+    stderr = std / math.sqrt(replications)
+    half_width = t_quantile_95(replications - 1) * stderr
+    independent_variance = (values[:, 0].var(ddof=1) + values[:, 1].var(ddof=1)) / replications
+    if stderr:
+        t_value = mean_difference / stderr
+        variance_reduction = float(independent_variance / stderr ** 2)
+    else:
+        t_value = math.copysign(math.inf, mean_difference) if mean_difference else 0.0
+        variance_reduction = math.inf if independent_variance else 1.0
+    ci_95 = (mean_difference - half_width, mean_difference + half_width)
+    return {'kpi': kpi, 'replications': replications, 'mean_difference': mean_difference, 'std': std,
+            'stderr': stderr, 'ci_95': ci_95, 't': t_value, 'significant': not ci_95[0] <= 0 <= ci_95[1],
+            'variance_reduction': variance_reduction}
+
+
+def compare_configurations(results: list, kpi: str, baseline: int = 0) -> list:
+    """
+    This function compares every configuration with the baseline configuration by paired differences.
+
+    Returns:
+        comparisons (list): {'configuration': index, **paired_difference} of every other configuration.
+
+    """
+    return [{'configuration': index, **paired_difference(results[baseline], configuration_results, kpi)}
+            for index, configuration_results in enumerate(results) if index != baseline]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='compare configurations by common random numbers')
+    parser.add_argument('file', help='comparison file (.json, .toml, .yaml or .yml)')
+    parser.add_argument('--policy-module', action='append', default=[],
+                        help='module that registers departure policies (see departure_policies.py)')
+    args = parser.parse_args(argv)
+    try:
+        import_policy_modules(args.policy_module)
+        data = load_scenario(args.file)
+        base = data.get('base', {})
+        configurations = [create_configuration({**base, **configuration, 'parameters': {**base.get('parameters', {}), **configuration.get('parameters', {})}})
+                          for configuration in data['configurations']]
+    except (OSError, ImportError, KeyError, ValueError) as error:
+        parser.error(str(error))
+    results = run_replications(configurations, data['demand_number'], data.get('replications', 10), data.get('seed', 0))
+    for kpi in data.get('kpis', DEFAULT_KPIS):
+        print(kpi)
+        for comparison in compare_configurations(results, kpi, data.get('baseline', 0)):
+            print(f"    configuration {comparison['configuration']} - baseline: {comparison['mean_difference']:.6g} "
+                  f"(95% ci {comparison['ci_95'][0]:.6g} .. {comparison['ci_95'][1]:.6g}, "
+                  f"{'significant' if comparison['significant'] else 'not significant'}, "
+                  f"variance reduction x{comparison['variance_reduction']:.3g})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
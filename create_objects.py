@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 import numpy as np
 import json
 from objects import Vertiport, Pad, Aircraft, Demand
@@ -18,8 +17,9 @@ def create_vertiport(file_name: str, aircraft_info: dict) -> (list, int):
         last_id (int): last objects id, to be used for creating other objects.
 
     """
+    import pandas as pd # imported here to avoid loading pandas where no excel file is parsed
     i = 1
-    root_path = os.getcwd() + f"\\{file_name}.xlsx"
+    root_path = os.path.join(os.getcwd(), f"{file_name}.xlsx")
     excel_data = pd.ExcelFile(root_path)
     sheet_names = excel_data.sheet_names
     excel_data = pd.read_excel(root_path, sheet_name=sheet_names[0])
@@ -68,6 +68,42 @@ def create_vertiport(file_name: str, aircraft_info: dict) -> (list, int):
     return vertiport_objects, last_id
 
 
+def create_network(vertiport_data: list, aircraft_info: dict, aircraft_id: int = 1) -> (list, int):
+    """
+    This function creates vertiport objects alongside their aircraft and pads without a vertiport 
+    file. Objects' ids are given in the same order as create_vertiport for a file that has all 
+    aircraft of a vertiport in its first row.
+
+    Args:
+        vertiport_data (list): list of dicts in this form (one dict for each vertiport):
+            {'name': str, 'position': [x in nmi, y in nmi], 'pads': int, 'aircraft_number': int, 'capacity': int}
+        aircraft_info (dict): aircraft info dict that contains its capacity, cruise speed and etc. .
+        aircraft_id (int): aircraft id in aircraft_info for all aircraft.
+
+    Returns:
+        vertiport_objects (list): list of built vertiport objects.
+        last_id (int): last objects id, to be used for creating other objects.
+
+    """
+    i = 1
+    vertiport_objects = []
+    for data in vertiport_data:
+        vertiport_obj = Vertiport(i, [], [], list(data['position']), data['name'], data['capacity'])
+        i += 1
+        pad_names = [f"pad {n + 1}" for n in range(data['pads'])]
+        if pad_names:
+            vertiport_obj.pads.append(Pad(i, pad_names.pop(0)))
+            i += 1
+        for _ in range(data['aircraft_number']):
+            vertiport_obj.aircrafts.append(Aircraft(i, aircraft_id, None, 'ready', [], aircraft_info[aircraft_id]['capacity']))
+            i += 1
+        for pad_name in pad_names:
+            vertiport_obj.pads.append(Pad(i, pad_name))
+            i += 1
+        vertiport_objects.append(vertiport_obj)
+    return vertiport_objects, i
+
+
 def create_demands(demand_schedule_data: dict, last_id: int) -> (list, int):
     """
     This function creates demand objects demand_schedule_data
@@ -2,7 +2,8 @@ import numpy as np
 from datetime import datetime
 
 
-def create_schedule(vertiports: list, demand_number: int, start_time: (int, float), end_time: (int, float)) -> dict:
+def create_schedule(vertiports: list, demand_number: int, start_time: (int, float), end_time: (int, float), 
+                    rng: np.random.Generator = None) -> dict:
     """
     This function creates demand schedule data from "start_time" to "end_time"
     for a number of demands with each of them want to go from a vertiport to another
@@ -13,6 +14,7 @@ def create_schedule(vertiports: list, demand_number: int, start_time: (int, floa
         start_time: start of simulation and first interval of demand production in epoch.
         end_time: last interval of demand production in epoch (simulation will continue for one 
                                                                hour after the end_time).
+        rng (np.random.Generator): random generator of demands. Default is None (global random state of numpy).
 
     Returns:
         data (dict): demand schedule data.
@@ -22,17 +24,18 @@ def create_schedule(vertiports: list, demand_number: int, start_time: (int, floa
     demand_start_time_list = []
     origin_id_list = []
     destination_id_list = [] 
+    random = np.random.rand if rng is None else rng.random
     
     for demand in range(demand_number):
-        origin_index = int(np.random.rand()*len(vertiports))
-        destination_index = int(np.random.rand()*len(vertiports))
+        origin_index = int(random()*len(vertiports))
+        destination_index = int(random()*len(vertiports))
         # avoiding equal origin and destination
         while destination_index == origin_index:
-            destination_index = int(np.random.rand()*len(vertiports))
+            destination_index = int(random()*len(vertiports))
         
         origin_id = vertiports[origin_index].id_
         destination_id = vertiports[destination_index].id_
-        demand_time = int(np.random.rand() * duration + start_time)
+        demand_time = int(random() * duration + start_time)
         demand_start_time_list.append(demand_time)
         origin_id_list.append(origin_id)
         destination_id_list.append(destination_id)
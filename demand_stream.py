@@ -0,0 +1,174 @@
+"""
+Streaming demands for long (multi-day) and out-of-core simulations. run_simulation reads the demands
+of an iterator when they start and passes finished demands to a sink (see "demand_sink" in
+run_simulation) that releases them, so memory does not grow with the number of days or demands:
+
+    summary = DemandSummary()
+    demands = generate_demands(vertiports, demands_per_day, start_time, end_time, days, last_id)
+    run_simulation(..., demands, ..., start_time, end_time + (days - 1) * DAY + end_margin, demand_sink=summary)
+    summary.satisfied_percent(), summary.mean_flight_delay()
+
+Aircraft, pads and vertiports are not reset between days, so the fleet state of a day carries over
+to the next one. Demand files (.csv or .parquet) should have origin_id, destination_id and
+demand_start_time columns (like the output of create_schedule) and be sorted by demand_start_time.
+They are read in chunks by read_demands and can be written day by day by write_demand_schedule.
+"""
+import csv
+import os
+
+from objects import Demand
+from create_objects import create_demands
+from create_schedule import create_schedule
+
+DAY = 86400 # seconds
+SCHEDULE_COLUMNS = ['demand_start_time', 'origin_id', 'destination_id']
+DELAYS = ['finding_aircraft', 'before_takeoff', 'before_turnaround', 'before_landing', 'flight_delay']
+
+
+def generate_demands(vertiports: list, demand_number: int, start_time: int, end_time: int, days: int = 1,
+                     last_id: int = 0, rng=None):
+    """
+    This generator yields random demands of "days" days. Every day has "demand_number" demands between
+    "start_time" and "end_time" of that day (create_schedule). A day is created only when its first
+    demand is needed, so only one day of demands is in memory.
+
+    Args:
+        vertiports (list): a list of vertiport objects.
+        demand_number (int): number of demands of each day.
+        start_time (int): start of demand production of the first day in epoch.
+        end_time (int): end of demand production of the first day in epoch.
+        days (int): number of days. Default is 1.
+        last_id (int): previous last objects id (returned by create_vertiport).
+        rng (np.random.Generator): random generator of demands. Default is None (global random state of numpy).
+
+    Raises:
+        ValueError: if demands of a day are longer than a day.
+
+    """
+    if end_time - start_time > DAY:
+        raise ValueError("demands of a day should be produced in less than a day")
+    for day in range(days):
+        demand_schedule_data = create_schedule(vertiports, demand_number, start_time + day * DAY, end_time + day * DAY, rng)
+        demands, last_id = create_demands(demand_schedule_data, last_id)
+        del demand_schedule_data
+        # released demands should not be kept by this list
+        demands.reverse()
+        while demands:
+            yield demands.pop()
+
+
+def read_demands(file_name: str, last_id: int = 0, chunk_size: int = 100000):
+    """
+    This function reads demands of a .csv or .parquet file in chunks of "chunk_size" rows.
+
+    Args:
+        file_name (str): demand file with origin_id, destination_id and demand_start_time columns.
+        last_id (int): previous last objects id (returned by create_vertiport).
+        chunk_size (int): number of rows that are read at once. Default is 100000.
+
+    Returns:
+        demands (generator): demand objects of the file.
+
+    Raises:
+        ValueError: if the file format is not supported or pyarrow is missing for parquet files.
+
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.csv':
+        import pandas as pd
+        chunks = pd.read_csv(file_name, usecols=SCHEDULE_COLUMNS, chunksize=chunk_size)
+    elif extension == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("pyarrow is required to read parquet demand files (pip install pyarrow)")
+        batches = pq.ParquetFile(file_name).iter_batches(batch_size=chunk_size, columns=SCHEDULE_COLUMNS)
+        chunks = (batch.to_pandas() for batch in batches)
+    else:
+        raise ValueError(f"demand file format '{extension}' is not supported (use .csv or .parquet)")
+    return _chunk_demands(chunks, last_id)
+
+
+def _chunk_demands(chunks, last_id: int):
+    for chunk in chunks:
+        demand_schedule_data = {column: chunk[column].tolist() for column in SCHEDULE_COLUMNS}
+        demands, last_id = create_demands(demand_schedule_data, last_id)
+        yield from demands
+
+
+def write_demand_schedule(file_name: str, demand_schedule_data: dict, append: bool = False) -> None:
+    """
+    This function writes demand schedule data (output of create_schedule) to a .csv or .parquet file.
+    Csv files can be appended (e.g. day by day).
+    """
+    import pandas as pd
+    data = pd.DataFrame({column: demand_schedule_data[column] for column in SCHEDULE_COLUMNS})
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.csv':
+        data.to_csv(file_name, mode='a' if append else 'w', header=not (append and os.path.exists(file_name)), index=False)
+    elif extension == '.parquet' and not append:
+        data.to_parquet(file_name, index=False)
+    else:
+        raise ValueError(f"demand schedules can not be written to '{extension}' files (use .csv or .parquet without append)")
+
+
+class DemandSummary:
+    def __init__(self):
+        """
+        A demand sink that only keeps the numbers of demands that are needed for KPIs
+        (see calc_kpis in run_main.py).
+        """
+        self.total_demands = 0
+        self.statuses = {}
+        self.flight_delay = 0 # total flight delay of satisfied demands in seconds
+
+    def __call__(self, demand: Demand) -> None:
+        status = demand.status.lower()
+        self.total_demands += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 'satisfied':
+            self.flight_delay += demand.delayed_at['flight_delay']
+
+    def satisfied_percent(self) -> (float, int):
+        """
+        This function returns the same outputs as calc_satisfied_percent in utility.py.
+        """
+        satisfied_demands = self.statuses.get('satisfied', 0)
+        return (satisfied_demands / self.total_demands) * 100, satisfied_demands
+
+    def mean_flight_delay(self) -> float:
+        """
+        This function returns mean flight delay of satisfied demands in hours (nan if there is none).
+        """
+        satisfied_demands = self.statuses.get('satisfied', 0)
+        return self.flight_delay / satisfied_demands / 3600 if satisfied_demands else float('nan')
+
+
+class DemandWriter:
+    def __init__(self, file_name: str, summary: DemandSummary = None):
+        """
+        A demand sink that writes every demand as a row of a csv file (and passes it to summary).
+
+        Args:
+            file_name (str): csv file of demands.
+            summary (DemandSummary): Default is None.
+        """
+        self.file = open(file_name, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['id', 'origin_id', 'destination_id', 'start_time', 'status', 'carrier_id'] + DELAYS)
+        self.summary = summary
+
+    def __call__(self, demand: Demand) -> None:
+        self.writer.writerow([demand.id_, demand.origin_id, demand.destination_id, demand.start_time, demand.status,
+                              demand.carrier_id] + [demand.delayed_at[delay] for delay in DELAYS])
+        if self.summary is not None:
+            self.summary(demand)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
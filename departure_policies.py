@@ -0,0 +1,169 @@
+"""
+Departure policies decide when an aircraft should leave its vertiport. A simulation resolves its
+policy once (a mode name like "wait" or a policy object) and engines ask it about every aircraft
+with should_depart. Policies can also evaluate many aircraft together with numpy arrays (evaluate),
+which is useful to study a policy on many aircraft states at once.
+
+A new policy is added by subclassing DeparturePolicy and registering it by a mode name:
+
+    @register_departure_policy('load_factor')
+    class LoadFactorPolicy(DeparturePolicy):
+        expire_waiting_demands = True
+
+        def __init__(self, load_factor: float = 0.75):
+            self.load_factor = load_factor
+
+        def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+                   maximum_wait_time, max_station_time):
+            return (number_of_demands >= self.load_factor * capacity) | (maximum_flight_delay >= maximum_wait_time)
+
+    run_simulation('load_factor', ...)                # or run_simulation(LoadFactorPolicy(0.5), ...)
+
+cli.py, common_random_numbers.py, the simulation service and sweep workers accept policies of other
+modules by their --policy-module option.
+"""
+import importlib
+import numpy as np
+
+from objects import Aircraft
+
+# aircraft statuses in which an aircraft can leave its vertiport
+DEPARTURE_STATUSES = ['occupied', 'ready']
+# registered policies: {mode name: policy class}
+DEPARTURE_POLICIES = {}
+
+
+class DeparturePolicy:
+    # name of the policy (set by register_departure_policy)
+    name = None
+    # demands that have waited more than maximum wait time without an aircraft are unsuccessful
+    expire_waiting_demands = False
+
+    def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+               maximum_wait_time, max_station_time):
+        """
+        This function decides that aircraft that can leave their vertiport (they are ready or
+        occupied and boarding is finished) should leave or not. Arguments are numbers of one
+        aircraft or numpy arrays of many aircraft (so only elementwise operators like "|" and "&"
+        should be used).
+
+        Args:
+            number_of_demands: number of demands in aircraft.
+            capacity: capacity of aircraft.
+            maximum_flight_delay: max flight delay of demands in aircraft in seconds.
+            time_on_vertiport: number of ticks that aircraft has been on the vertiport.
+            maximum_wait_time: max wait time for passengers for an aircraft in seconds.
+            max_station_time: max time on station of the vertiport (see get_vertiport_max_station_time).
+
+        Returns:
+            time_to_go: a bool (or a bool array).
+
+        """
+        raise NotImplementedError
+
+    def should_depart(self, aircraft: Aircraft, maximum_flight_delay: int, maximum_wait_time: int,
+                      max_station_time: float) -> bool:
+        """
+        This function determines that an aircraft should leave the vertiport or not.
+        """
+        if aircraft.boarding_time or aircraft.status.lower() not in DEPARTURE_STATUSES:
+            return False
+        return bool(self.decide(len(aircraft.demands), aircraft.capacity, maximum_flight_delay,
+                                aircraft.time_on_vertiport, maximum_wait_time, max_station_time))
+
+    def evaluate(self, aircrafts: list, maximum_flight_delays: list, maximum_wait_time: int,
+                 max_station_time: float) -> np.ndarray:
+        """
+        This function determines that aircraft of a vertiport should leave it or not (should_depart
+        of every aircraft in one vectorized call).
+
+        Args:
+            aircrafts (list): list of aircraft objects.
+            maximum_flight_delays (list): max flight delay of demands in each aircraft.
+
+        Returns:
+            time_to_go (np.ndarray): a bool for each aircraft.
+
+        """
+        can_depart = np.array([not aircraft.boarding_time and aircraft.status.lower() in DEPARTURE_STATUSES
+                               for aircraft in aircrafts], dtype=bool)
+        number_of_demands = np.array([len(aircraft.demands) for aircraft in aircrafts], dtype=int)
+        capacity = np.array([aircraft.capacity for aircraft in aircrafts], dtype=int)
+        time_on_vertiport = np.array([aircraft.time_on_vertiport for aircraft in aircrafts], dtype=int)
+        time_to_go = self.decide(number_of_demands, capacity, np.asarray(maximum_flight_delays, dtype=float).reshape(-1),
+                                 time_on_vertiport, maximum_wait_time, max_station_time)
+        return can_depart & np.broadcast_to(np.asarray(time_to_go, dtype=bool), can_depart.shape)
+
+
+def register_departure_policy(name: str):
+    """
+    This decorator registers a DeparturePolicy class by a mode name.
+
+    Raises:
+        ValueError: if a policy is already registered by this name.
+
+    """
+    def register(policy_class):
+        if name.lower() in DEPARTURE_POLICIES:
+            raise ValueError(f"departure policy '{name}' is already registered")
+        policy_class.name = name.lower()
+        DEPARTURE_POLICIES[name.lower()] = policy_class
+        return policy_class
+    return register
+
+
+def resolve_departure_policy(mode) -> DeparturePolicy:
+    """
+    This function returns the policy of a mode name (or the policy itself if it is a policy object).
+
+    Raises:
+        ValueError: if no policy is registered by the mode name.
+
+    """
+    if isinstance(mode, DeparturePolicy):
+        return mode
+    if mode.lower() not in DEPARTURE_POLICIES:
+        raise ValueError(f"unknown mode '{mode}' (registered modes: {sorted(DEPARTURE_POLICIES)})")
+    return DEPARTURE_POLICIES[mode.lower()]()
+
+
+def import_policy_modules(module_names: list) -> None:
+    """
+    This function imports modules that register departure policies (e.g. a --policy-module option),
+    so their mode names can be used. Worker processes that are forked after that have them too.
+    """
+    for module_name in module_names or []:
+        importlib.import_module(module_name)
+
+
+@register_departure_policy('wait')
+class WaitPolicy(DeparturePolicy):
+    expire_waiting_demands = True
+
+    def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+               maximum_wait_time, max_station_time):
+        return (maximum_flight_delay >= maximum_wait_time) | (number_of_demands == capacity)
+
+
+@register_departure_policy('capacity')
+class CapacityPolicy(DeparturePolicy):
+    def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+               maximum_wait_time, max_station_time):
+        return number_of_demands == capacity
+
+
+@register_departure_policy('capacity_station')
+class CapacityStationPolicy(DeparturePolicy):
+    def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+               maximum_wait_time, max_station_time):
+        return (number_of_demands == capacity) | (time_on_vertiport > max_station_time)
+
+
+@register_departure_policy('station_wait')
+class StationWaitPolicy(DeparturePolicy):
+    expire_waiting_demands = True
+
+    def decide(self, number_of_demands, capacity, maximum_flight_delay, time_on_vertiport,
+               maximum_wait_time, max_station_time):
+        return (number_of_demands == capacity) | (time_on_vertiport > max_station_time) | \
+            (maximum_flight_delay >= maximum_wait_time)
@@ -0,0 +1,278 @@
+"""
+Differential test harness for simulation engines. It runs the reference engine (run_simulation)
+and an alternative engine on the same seeded networks and demands, compares their state after
+every tick (demands' status and delays, aircraft and pads) and their final results (demands,
+aircraft flight hours and KPIs), and reports the first tick and the object that differ.
+
+    python differential_harness.py                        # all scenarios with all engines
+    python differential_harness.py --engine streaming --scenario triangle_wait
+
+A new engine is added to ENGINES as a function with the same inputs and outputs as run_simulation
+(and an "observer" argument that is called after every tick, see run_simulation).
+Every scenario also checks that the vectorized evaluate of every registered departure policy
+agrees with its should_depart on the aircraft of every vertiport after every tick.
+"""
+import argparse
+import math
+import os
+import sys
+import numpy as np
+
+from create_objects import create_network, create_demands
+from create_schedule import create_schedule
+from departure_policies import DEPARTURE_POLICIES
+from run_main import create_parameters, create_aircraft_info, load_max_station_time_data, calc_kpis
+from run_simulation import run_simulation
+
+MODES = ['wait', 'capacity', 'capacity_station', 'station_wait']
+# small networks of the corpus
+NETWORKS = {'triangle': [{'name': 'A', 'position': [0, 0], 'pads': 2, 'aircraft_number': 4, 'capacity': 8},
+                         {'name': 'B', 'position': [10, 17.32], 'pads': 2, 'aircraft_number': 4, 'capacity': 8},
+                         {'name': 'C', 'position': [-10, 17.32], 'pads': 2, 'aircraft_number': 4, 'capacity': 8}],
+            'line': [{'name': 'A', 'position': [0, 0], 'pads': 1, 'aircraft_number': 3, 'capacity': 5},
+                     {'name': 'B', 'position': [8, 0], 'pads': 2, 'aircraft_number': 3, 'capacity': 5},
+                     {'name': 'C', 'position': [16, 0], 'pads': 1, 'aircraft_number': 2, 'capacity': 4},
+                     {'name': 'D', 'position': [24, 0], 'pads': 1, 'aircraft_number': 3, 'capacity': 5}]}
+# a three hours window
+WINDOW = {'start_time': 1668832200, 'end_time': 1668832200 + 3 * 3600, 'end_margin': 1800}
+
+
+def create_corpus() -> list:
+    """
+    This function creates the corpus of scenarios: every mode on every network, and congested
+    scenarios with long landings (holding) with and without diversion.
+    """
+    corpus = []
+    for network in NETWORKS:
+        for mode in MODES:
+            corpus.append({'name': f'{network}_{mode}', 'network': network, 'mode': mode, 'demand_number': 150,
+                           'seed': 1, 'maximum_wait_time': 900, 'capacity': 4, 'cruise_speed': 120,
+                           'parameters': dict(WINDOW)})
+    for mode in MODES:
+        congested = {**WINDOW, 'landing_occupation_time': 600, 'holding_duration': 900}
+        corpus.append({'name': f'congested_{mode}', 'network': 'line', 'mode': mode, 'demand_number': 300,
+                       'seed': 2, 'maximum_wait_time': 1200, 'capacity': 4, 'cruise_speed': 120,
+                       'parameters': congested})
+        corpus.append({'name': f'diversion_{mode}', 'network': 'line', 'mode': mode, 'demand_number': 300,
+                       'seed': 3, 'maximum_wait_time': 1200, 'capacity': 4, 'cruise_speed': 120,
+                       'parameters': {**congested, 'diversion_holding_time': 300}})
+    return corpus
+
+
+def create_inputs(scenario: dict, max_station_time_data: dict) -> dict:
+    """
+    This function creates fresh objects and arguments of a scenario for an engine.
+    """
+    parameters = create_parameters(scenario['parameters'])
+    aircraft_info = create_aircraft_info(scenario['cruise_speed'], scenario['capacity'], parameters)
+    vertiports, last_id = create_network(NETWORKS[scenario['network']], aircraft_info)
+    np.random.seed(scenario['seed'])
+    demand_schedule_data = create_schedule(vertiports, scenario['demand_number'], parameters['start_time'], parameters['end_time'])
+    demands, last_id = create_demands(demand_schedule_data, last_id)
+    return {'mode': scenario['mode'], 'vertiports': vertiports, 'demands': demands,
+            'landing_occupation_time': parameters['landing_occupation_time'],
+            'takeoff_occupation_time': parameters['takeoff_occupation_time'],
+            'battery_swap_time': parameters['battery_swap_time'],
+            'board_time_per_passenger': parameters['board_time_per_passenger'],
+            'deboard_time_per_passenger': parameters['deboard_time_per_passenger'],
+            'holding_duration': parameters['holding_duration'], 'aircraft_info': aircraft_info,
+            'max_station_time_data': max_station_time_data, 'maximum_wait_time': scenario['maximum_wait_time'],
+            'start_time': parameters['start_time'], 'end_time': parameters['end_time'] + parameters['end_margin'],
+            'diversion_holding_time': parameters['diversion_holding_time']}
+
+
+def run_streaming_engine(mode, vertiports, demands, *args, observer=None, **kwargs):
+    """
+    This function runs run_simulation with an iterator of demands and a demand sink (demands are
+    released when they are finished). Observer and outputs still get all demands.
+    """
+    all_demands = list(demands)
+    streaming_observer = None if observer is None else lambda current_epoch, vertiports, demands: observer(current_epoch, vertiports, all_demands)
+    vertiports, demands, msg_list, current_epoch = run_simulation(mode, vertiports, iter(all_demands), *args, observer=streaming_observer,
+                                                                  demand_sink=lambda demand: None, **kwargs)
+    return vertiports, all_demands, msg_list, current_epoch
+
+
+ENGINES = {'streaming': run_streaming_engine}
+# positional arguments of engines (the same as run_simulation)
+ARGUMENTS = ['mode', 'vertiports', 'demands', 'landing_occupation_time', 'takeoff_occupation_time', 'battery_swap_time',
+             'board_time_per_passenger', 'deboard_time_per_passenger', 'holding_duration', 'aircraft_info',
+             'max_station_time_data', 'maximum_wait_time', 'start_time', 'end_time']
+
+
+def snapshot(vertiports: list, demands: list) -> dict:
+    """
+    This function takes a snapshot of the state of a simulation that engines should agree on.
+    """
+    state = {}
+    for demand in demands:
+        state[('demand', demand.id_)] = (demand.status, tuple(demand.delayed_at.values()))
+    for vertiport in vertiports:
+        state[('vertiport', vertiport.id_)] = (list(vertiport.holding_aircrafts), len(vertiport.arriving_aircrafts) + vertiport.released_arrivals)
+        for pad in vertiport.pads:
+            state[('pad', pad.id_)] = pad.status
+        for aircraft in vertiport.aircrafts:
+            state[('aircraft', aircraft.id_)] = (vertiport.id_, aircraft.status, aircraft.destination_id,
+                                                 list(aircraft.demands), aircraft.flight_hours)
+    return state
+
+
+def run_engine(engine, inputs: dict) -> (list, tuple):
+    """
+    This function runs an engine and records snapshots of all ticks.
+
+    Returns:
+        snapshots (list): (epoch, snapshot) of every tick.
+        outputs (tuple): outputs of the engine (vertiports, demands, msg_list, current_epoch).
+
+    """
+    snapshots = []
+    inputs = dict(inputs)
+    arguments = [inputs.pop(name) for name in ARGUMENTS]
+    outputs = engine(*arguments, observer=lambda current_epoch, vertiports, demands: snapshots.append((current_epoch, snapshot(vertiports, demands))),
+                     **inputs)
+    return snapshots, outputs
+
+
+def is_close(value_1, value_2, tolerance: float) -> bool:
+    if isinstance(value_1, (int, float, np.number)) and isinstance(value_2, (int, float, np.number)):
+        if math.isnan(value_1) and math.isnan(value_2):
+            return True
+        return math.isclose(value_1, value_2, rel_tol=tolerance, abs_tol=tolerance)
+    if isinstance(value_1, (tuple, list)) and isinstance(value_2, (tuple, list)):
+        return len(value_1) == len(value_2) and all(is_close(a, b, tolerance) for a, b in zip(value_1, value_2))
+    return value_1 == value_2
+
+
+def first_difference(state_1: dict, state_2: dict, tolerance: float) -> (tuple, None):
+    """
+    This function finds the first object (in a stable order) that is different in two snapshots.
+    """
+    for key in sorted(set(state_1) | set(state_2)):
+        if not is_close(state_1.get(key), state_2.get(key), tolerance):
+            return key, state_1.get(key), state_2.get(key)
+    return None
+
+
+def compare_engines(scenario: dict, engine_name: str, max_station_time_data: dict, tolerance: float = 1e-9) -> dict:
+    """
+    This function runs the reference engine and an alternative engine on a scenario and compares them.
+
+    Returns:
+        report (dict): {'scenario', 'engine', 'passed', 'ticks', 'first_divergence', 'final_differences'}.
+            first_divergence is None or {'epoch', 'tick', 'object', 'reference', 'alternative'}.
+
+    """
+    reference_snapshots, reference_outputs = run_engine(run_simulation, create_inputs(scenario, max_station_time_data))
+    alternative_snapshots, alternative_outputs = run_engine(ENGINES[engine_name], create_inputs(scenario, max_station_time_data))
+    report = {'scenario': scenario['name'], 'engine': engine_name, 'ticks': len(reference_snapshots),
+              'first_divergence': None, 'final_differences': []}
+    for tick in range(max(len(reference_snapshots), len(alternative_snapshots))):
+        if tick >= len(reference_snapshots) or tick >= len(alternative_snapshots):
+            epoch = (reference_snapshots + alternative_snapshots)[-1][0]
+            report['first_divergence'] = {'epoch': epoch, 'tick': tick, 'object': 'simulation length',
+                                          'reference': len(reference_snapshots), 'alternative': len(alternative_snapshots)}
+            break
+        (reference_epoch, reference_state), (alternative_epoch, alternative_state) = reference_snapshots[tick], alternative_snapshots[tick]
+        difference = first_difference({('epoch', 0): reference_epoch, **reference_state},
+                                      {('epoch', 0): alternative_epoch, **alternative_state}, tolerance)
+        if difference is not None:
+            report['first_divergence'] = {'epoch': reference_epoch, 'tick': tick, 'object': difference[0],
+                                          'reference': difference[1], 'alternative': difference[2]}
+            break
+    # final results
+    reference_vertiports, reference_demands, reference_msg_list, reference_epoch = reference_outputs
+    alternative_vertiports, alternative_demands, alternative_msg_list, alternative_epoch = alternative_outputs
+    finals = {'msg_list': (reference_msg_list, alternative_msg_list), 'last_epoch': (reference_epoch, alternative_epoch)}
+    reference_kpis = calc_kpis(reference_vertiports, reference_demands, reference_msg_list, scenario['capacity'])
+    alternative_kpis = calc_kpis(alternative_vertiports, alternative_demands, alternative_msg_list, scenario['capacity'])
+    for kpi in reference_kpis:
+        finals['kpi ' + kpi] = (reference_kpis[kpi], alternative_kpis.get(kpi))
+    for (key, reference_value) in snapshot(reference_vertiports, reference_demands).items():
+        finals[key] = (reference_value, None)
+    for (key, alternative_value) in snapshot(alternative_vertiports, alternative_demands).items():
+        finals[key] = (finals.get(key, (None,))[0], alternative_value)
+    for key, (reference_value, alternative_value) in finals.items():
+        if not is_close(reference_value, alternative_value, tolerance):
+            report['final_differences'].append({'object': key, 'reference': reference_value, 'alternative': alternative_value})
+    report['passed'] = report['first_divergence'] is None and not report['final_differences']
+    return report
+
+
+def compare_policies(scenario: dict, max_station_time_data: dict, max_station_times: list = None) -> dict:
+    """
+    This function compares evaluate and should_depart of every registered departure policy on the
+    aircraft of every vertiport after every tick of a scenario (run by run_simulation).
+
+    Args:
+        max_station_times (list): max station times of the comparisons. Default is None ([0, 5, inf]).
+
+    Returns:
+        report (dict): {'scenario', 'passed', 'comparisons', 'first_difference'}. first_difference is
+            None or {'epoch', 'policy', 'vertiport', 'max_station_time', 'evaluate', 'should_depart'}.
+
+    """
+    max_station_times = [0, 5, np.inf] if max_station_times is None else max_station_times
+    policies = {name: policy_class() for name, policy_class in DEPARTURE_POLICIES.items()}
+    report = {'scenario': scenario['name'], 'comparisons': 0, 'first_difference': None}
+    inputs = create_inputs(scenario, max_station_time_data)
+
+    def observer(current_epoch, vertiports, demands):
+        if report['first_difference'] is not None:
+            return
+        demand_map = {demand.id_: demand for demand in demands}
+        for vertiport in vertiports:
+            maximum_flight_delays = [max([demand_map[demand_id].delayed_at['flight_delay'] for demand_id in aircraft.demands] or [0])
+                                     for aircraft in vertiport.aircrafts]
+            for name, policy in policies.items():
+                for max_station_time in max_station_times:
+                    evaluated = policy.evaluate(vertiport.aircrafts, maximum_flight_delays, maximum_wait_time, max_station_time)
+                    decided = [policy.should_depart(aircraft, maximum_flight_delay, maximum_wait_time, max_station_time)
+                               for aircraft, maximum_flight_delay in zip(vertiport.aircrafts, maximum_flight_delays)]
+                    report['comparisons'] += len(decided)
+                    if evaluated.tolist() != decided:
+                        report['first_difference'] = {'epoch': current_epoch, 'policy': name, 'vertiport': vertiport.id_,
+                                                      'max_station_time': max_station_time, 'evaluate': evaluated.tolist(),
+                                                      'should_depart': decided}
+                        return
+    maximum_wait_time = inputs['maximum_wait_time']
+    arguments = [inputs.pop(name) for name in ARGUMENTS]
+    run_simulation(*arguments, observer=observer, **inputs)
+    report['passed'] = report['first_difference'] is None
+    return report
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='compare simulation engines with the reference engine (run_simulation)')
+    parser.add_argument('--engine', action='append', choices=list(ENGINES), help='engine to test (default: all engines)')
+    parser.add_argument('--scenario', action='append', help='scenario name of the corpus (default: all scenarios)')
+    parser.add_argument('--tolerance', type=float, default=1e-9)
+    args = parser.parse_args(argv)
+    corpus = create_corpus()
+    if args.scenario:
+        unknown = set(args.scenario) - set(scenario['name'] for scenario in corpus)
+        if unknown:
+            parser.error(f"unknown scenarios: {sorted(unknown)}")
+        corpus = [scenario for scenario in corpus if scenario['name'] in args.scenario]
+    max_station_time_data = load_max_station_time_data(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'max_station_time.p'))
+    failures = 0
+    for engine_name in args.engine or list(ENGINES):
+        for scenario in corpus:
+            report = compare_engines(scenario, engine_name, max_station_time_data, args.tolerance)
+            print(f"{'PASS' if report['passed'] else 'FAIL'} {engine_name} {scenario['name']} ({report['ticks']} ticks)")
+            if report['first_divergence'] is not None:
+                print(f"    first divergence: {report['first_divergence']}")
+            for difference in report['final_differences'][:10]:
+                print(f"    final difference: {difference}")
+            failures += not report['passed']
+    for scenario in corpus:
+        report = compare_policies(scenario, max_station_time_data)
+        print(f"{'PASS' if report['passed'] else 'FAIL'} policies {scenario['name']} ({report['comparisons']} comparisons)")
+        if report['first_difference'] is not None:
+            print(f"    first difference: {report['first_difference']}")
+        failures += not report['passed']
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
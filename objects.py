@@ -12,6 +12,8 @@ class Vertiport:
         self.holding_aircrafts = []
         self.arriving_aircrafts = []
         self.arriving_spochs = []
+        self.diverted_aircrafts = []
+        self.released_arrivals = 0
         
         
 class Pad:
@@ -38,6 +40,7 @@ class Aircraft:
         self.holding_violation = False
         self.time_on_vertiport = 0
         self.boarding_time = 0
+        self.diverted_from = None
         
 
 class Demand:
@@ -0,0 +1,145 @@
+"""
+A local cache of simulation results. Every result is stored by a key that is the hash of all
+inputs of a simulation: contents of the network file and the max station time file, physical
+constants, mode, cruise speed, capacity, max wait time, demand number, seed and the engine version
+(hash of the simulation source files and the source file of the departure policy), so results of
+changed code are never used. Only KPIs are stored (not demand and vertiport objects) and least
+recently used results are evicted when the cache is bigger than its maximum size.
+Results of simulations without a seed are not reproducible and should not be cached.
+"""
+import hashlib
+import inspect
+import json
+import math
+import os
+import sqlite3
+import time
+
+from departure_policies import resolve_departure_policy
+
+# source files that change simulation results
+ENGINE_FILES = ['objects.py', 'create_objects.py', 'create_schedule.py', 'run_simulation.py',
+                'spatial_index.py', 'utility.py', 'run_main.py', 'demand_stream.py',
+                'departure_policies.py', 'steady_state.py', 'shared_network.py']
+# parameters that do not change simulation results
+IGNORED_PARAMETERS = ['max_station_time_file', 'telemetry_interval']
+
+_file_digests = {}
+
+
+def file_digest(file_name: str) -> str:
+    """
+    This function calculates sha256 of a file's contents (it will be calculated again only if
+    the file is changed).
+    """
+    stat = os.stat(file_name)
+    key = (os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_digests:
+        with open(file_name, 'rb') as file:
+            _file_digests[key] = hashlib.sha256(file.read()).hexdigest()
+    return _file_digests[key]
+
+
+def engine_version() -> str:
+    """
+    This function calculates version of the simulation engine from its source files.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for file_name in ENGINE_FILES:
+        digest.update(file_name.encode())
+        digest.update(file_digest(os.path.join(directory, file_name)).encode())
+    return digest.hexdigest()
+
+
+def json_value(value):
+    """
+    This function converts a KPI value (numpy numbers, nan and inf) to a json friendly value.
+    """
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if float(value).is_integer() and not isinstance(value, float):
+        return int(value)
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+class ResultCache:
+    def __init__(self, file_name: str = 'result_cache.sqlite', max_size: int = 256 * 1024 ** 2):
+        """
+        Args:
+            file_name (str): sqlite file of the cache.
+            max_size (int): maximum size of stored records in bytes.
+        """
+        self.file_name = file_name
+        self.max_size = max_size
+        self.connection = sqlite3.connect(file_name, timeout=60)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, record TEXT, '
+                                    'size INTEGER, last_access REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+
+    def key(self, vertiport_file_name: str, mode: str, cruise_speed: (int, float), capacity: int,
+            maximum_wait_time: (int, float), demand_number: int, seed: int, parameters: dict) -> str:
+        """
+        This function creates the key of a simulation.
+
+        Args:
+            parameters (dict): all physical constants (see create_parameters in run_main.py).
+            Other arguments are described in run_main.
+
+        """
+        # source file of the departure policy (policies of other modules are not in ENGINE_FILES)
+        policy_file = inspect.getsourcefile(type(resolve_departure_policy(mode)))
+        inputs = {'network': file_digest(f"{vertiport_file_name}.xlsx"), 'policy': file_digest(policy_file),
+                  'max_station_time': file_digest(parameters['max_station_time_file']),
+                  'parameters': {name: value for name, value in parameters.items() if name not in IGNORED_PARAMETERS},
+                  'mode': mode.lower(), 'cruise_speed': cruise_speed, 'capacity': capacity,
+                  'maximum_wait_time': maximum_wait_time, 'demand_number': demand_number, 'seed': seed,
+                  'engine': engine_version()}
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> (dict, None):
+        """
+        This function returns the stored KPIs of a key (or None if it is not stored).
+        """
+        with self.connection:
+            row = self.connection.execute('SELECT record FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, out_data: dict) -> None:
+        """
+        This function stores KPIs of a simulation output (demands and vertiports are not stored)
+        and evicts least recently used records if the cache is too big.
+        """
+        record = json.dumps({name: json_value(value) for name, value in out_data.items()
+                             if name not in ['demands', 'vertiports']})
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                    (key, record, len(record), time.time()))
+            total_size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            if total_size > self.max_size:
+                rows = self.connection.execute('SELECT key, size FROM results ORDER BY last_access').fetchall()
+                evicted = []
+                for old_key, size in rows:
+                    if total_size <= self.max_size:
+                        break
+                    evicted.append((old_key,))
+                    total_size -= size
+                self.connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+    def size(self) -> (int, int):
+        """
+        This function returns number of records and their total size in bytes.
+        """
+        return self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM results')
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,27 +1,56 @@
 import pickle as pk
+import numpy as np
 
 from create_objects import create_vertiport, create_demands
 from create_schedule import create_schedule
 from run_simulation import run_simulation
-from utility import cost_calculator, calc_satisfied_percent, calc_mean_flight_delay, calc_mean_flight_hours, calc_number_of_flights
+from telemetry import TelemetryRecorder
+from result_cache import ResultCache
+from demand_stream import DAY, DemandSummary, generate_demands
+from steady_state import KPIS as STEADY_STATE_KPIS, SteadyStateMonitor
+from utility import calc_cost, calc_satisfied_percent, calc_mean_flight_delay, calc_mean_flight_hours, calc_number_of_flights, \
+    calc_number_of_diversions
+
+# physical constants of simulations (their descriptions are available in run_main)
+DEFAULT_PARAMETERS = {'climb_speed': 113, # knots
+                      'descent_speed': 113, # knots
+                      'aircraft_climb_rate': 1000, # ft/min
+                      'aircraft_descent_rate': 1000, # ft/min
+                      'cruise_altitude': 1500, # ft
+                      'start_time': 1668832200, # epoch
+                      'end_time': 1668886200, # epoch
+                      'landing_occupation_time': 180, # seconds
+                      'takeoff_occupation_time': 120, # seconds
+                      'holding_duration': 600, # seconds
+                      'battery_swap_time': 300, # seconds
+                      'board_time_per_passenger': 60, # seconds
+                      'deboard_time_per_passenger': 60, # seconds
+                      'end_margin': 3600, # seconds
+                      'max_station_time_file': 'max_station_time.p',
+                      'telemetry_interval': 300, # seconds
+                      'diversion_holding_time': None, # seconds
+                      'days': 1,
+                      'steady_state_tolerance': None}
+
 
 def run_main(mode: str, cruise_speed: (int, float), capacity: int, vertiport_file_name: str, start_demand: int, 
-             end_demand: int, demand_step: int, maximum_wait_time: (float, int)) -> None:
+             end_demand: int, demand_step: int, maximum_wait_time: (float, int), parameters: dict = None, 
+             telemetry_path: str = None, seed: int = None, cache: ResultCache = None) -> None:
     """
     This function will run a series of simulations for 16 hours for given "mode", "cruise_speed", 
     aircraft "capacity" and "maximum_flight_delay". This simulations will be based on certain 
     number of demands between "start_demand" and "end_demand" by increment in the start demand
     by "demand_step". All simulations' data will be stored in a file with this file name:
         mode + '_speed_' + str(cruise_speed) + '_wait_' + str(maximum_fligh_delay) + '_capacity_' + str(capacity) + '.p'
-    othe types of data could be changed in the body of this function:
+    othe types of data could be changed by "parameters" (missing ones are taken from DEFAULT_PARAMETERS):
         1- climb_speed: total speed of aircraft in climb phase in knots.
         2- descent_speed: total speed of aircraft in descent phase in knots.
         3- aircraft_climb_rate:  rate of increase in altitude in climb phase in fpm.
         4- aircraft_descent_rate:  rate of decrease in altitude in descent phase in fpm.
         5- cruise_altitude: cruise altitude of aircraft in ft. (AGL)
         6- start_time: start of simulation and first interval of demand production in epoch.
-        7- end_time: last interval of demand production in epoch (simulation will continue for one 
-                                                         hour after the end_time).
+        7- end_time: last interval of demand production in epoch (simulation will continue for 
+                                                         "end_margin" after the end_time).
         8- landing_occupation_time: required time for an aircraft to descent, land and to leave a 
                                     landing pad in seconds.
         9- takeoff_occupation_time: required time for an aircraft to finish its takeoff sequences 
@@ -30,6 +59,21 @@ def run_main(mode: str, cruise_speed: (int, float), capacity: int, vertiport_fil
         11- battery_swap_time: required time to change an aircraft's battery in seconds.
         12- board_time_per_passenger: required time to board a passenger in seconds.
         13- deboard_time_per_passenger: required time to deboard a passenger in seconds.
+        14- end_margin: time that simulation will continue after the end_time in seconds.
+        15- max_station_time_file: file of max station time data (created by create_max_station_time_file.py).
+        16- telemetry_interval: time between two telemetry samples in seconds (see telemetry.py).
+        17- diversion_holding_time: holding time after which an aircraft diverts to the nearest vertiport 
+                                    with an empty pad and enough capacity in seconds (None: no diversion). 
+                                    It should be less than holding_duration.
+        18- days: number of simulated days. Every day has the same number of demands between start_time and 
+                  end_time of that day and the fleet state carries over to the next day. Demands of 
+                  multi-day simulations are streamed (see demand_stream.py) and are not stored.
+        19- steady_state_tolerance: if it is given, the warm-up is detected and simulations stop when queues 
+                                    and delays are in steady state (relative half width of their confidence 
+                                    intervals is less than this tolerance, or less than an absolute tolerance 
+                                    for gauges near zero). KPIs of demands after the warm-up 
+                                    are added to the outputs (see steady_state.py). KPIs of the whole window 
+                                    are None in simulations that are stopped. Default is None.
 
     Args:
         mode (str): is one of these four modes to determine when an aircraft should leave the vertiport:
@@ -44,61 +88,199 @@ def run_main(mode: str, cruise_speed: (int, float), capacity: int, vertiport_fil
         end_demand (int): maximum demand number to simulate.
         demand_step (int): amount of increment in demand number in each step.
         maximum_wait_time ((float, int)): Max wait time for passengers for an aircraft.
+        parameters (dict): physical constants that are described above. Default is None.
+        telemetry_path (str): if it is given, vertiports' telemetry of every simulation will be recorded in
+                              telemetry_path + '_' + str(demand number) files. Default is None.
+        seed (int): seed of random demand schedules (the same seed is used for every demand number). 
+                    Default is None (current random state).
+        cache (ResultCache): cache of simulation results (see result_cache.py). It is used only when 
+                             "seed" is given and cached results have no demands and vertiports. 
+                             Default is None.
 
     Returns:
         None.
 
     """
-    climb_speed = 113 #knots
-    descent_speed = 113
-    aircraft_climb_rate = 1000 # ft/min
-    aircraft_descent_rate = 1000 # ft/min
-    cruise_altitude = 1500 # ft
-    # creating aircraft info dict
-    aircraft_info = {1:{'climb_speed':climb_speed, 'climb_rate':aircraft_climb_rate, 
-                    'cruise_altitude':cruise_altitude, 'cruise_speed':cruise_speed,
-                    'descent_speed':descent_speed, 'descent_rate':aircraft_descent_rate, 'capacity':capacity}}
-    start_time = 1668832200 # epoch
-    end_time = 1668886200 # epoch
-    landing_occupation_time = 180 #seconds
-    takeoff_occupation_time = 120 #seconds
-    holding_duration = 600 #seconds
-    # Loading max station time data
-    max_station_time_data = pk.load(open('max_station_time.p', 'rb'))
-    battery_swap_time = 300 
-    board_time_per_passenger = 60 
-    deboard_time_per_passenger = 60
-    
+    parameters = create_parameters(parameters)
+    max_station_time_data = load_max_station_time_data(parameters['max_station_time_file'])
     out_data = {}
     out_file_name = mode + '_speed_' + str(cruise_speed) + '_wait_' + str(maximum_wait_time) + '_capacity_' + str(capacity) + '.p'
     
     while start_demand <= end_demand:
-        # creating vertiport objects
-        vertiports, last_id = create_vertiport(vertiport_file_name, aircraft_info)
-        # creating demand schedule info
-        demand_schedule_data = create_schedule(vertiports, start_demand, start_time, end_time)
-        # creating demand objects
-        demands, last_id = create_demands(demand_schedule_data, last_id)
-        # running simultion
-        vertiports, demands, msg_list, current_epoch = run_simulation(mode, vertiports, demands, landing_occupation_time, takeoff_occupation_time, battery_swap_time, board_time_per_passenger, deboard_time_per_passenger, \
-                                                                      holding_duration, aircraft_info, max_station_time_data, maximum_wait_time, start_time, end_time + 3600)
-        # storing data
-        if msg_list:
-            out_data[start_demand] = {'total_demands':None, 'demands':None, 'vertiports':None, 'satisfied_demands': None,
-                                    'cost':None, 'cost_per_demand':None, 'cost_per_aircraft':None, 'mean_flight_delay': None,
-                                    'mean_flight_hours':None, 'passenger_per_flight':None}
+        cache_key = None
+        if cache is not None and seed is not None and not telemetry_path:
+            cache_key = cache.key(vertiport_file_name, mode, cruise_speed, capacity, maximum_wait_time, start_demand, 
+                                  seed, parameters)
+        cached_data = cache.get(cache_key) if cache_key else None
+        if cached_data is not None:
+            out_data[start_demand] = {**cached_data, 'demands': None, 'vertiports': None}
         else:
-            cost, cost_per_demand, cost_per_aircraft = cost_calculator(vertiports, demands, capacity)
-            satisfied_demands_percent, satisfied_demands = calc_satisfied_percent(demands)
-            mean_flight_delay = calc_mean_flight_delay(demands)
-            mean_flight_hours = calc_mean_flight_hours(vertiports)
-            number_of_flights = calc_number_of_flights(vertiports)
-            passenger_per_flight = satisfied_demands / number_of_flights
-            out_data[start_demand] = {'total_demands':len(demands), 'demands':demands, 'vertiports':vertiports, 'satisfied_demands':satisfied_demands_percent,
-                                       'cost':cost, 'cost_per_demand':cost_per_demand, 'cost_per_aircraft':cost_per_aircraft,
-                                       'mean_flight_delay': mean_flight_delay, 'mean_flight_hours':mean_flight_hours,
-                                       'passenger_per_flight':passenger_per_flight}
+            # creating vertiport objects
+            vertiports, last_id = create_vertiport(vertiport_file_name, create_aircraft_info(cruise_speed, capacity, parameters))
+            # running simultion and storing data
+            out_data[start_demand] = simulate_demand(mode, cruise_speed, capacity, vertiports, last_id, start_demand, 
+                                                     maximum_wait_time, max_station_time_data, seed=seed, parameters=parameters,
+                                                     telemetry_path=telemetry_path and telemetry_path + '_' + str(start_demand))
+            if cache_key:
+                cache.put(cache_key, out_data[start_demand])
         # increment in demand
         start_demand += demand_step
         # drop data in the form of a pickle file
         pk.dump(out_data,open(out_file_name,'wb'))
+
+
+def create_parameters(parameters: dict = None) -> dict:
+    """
+    This function fills missing physical constants of "parameters" by DEFAULT_PARAMETERS.
+
+    Raises:
+        ValueError: if there is an unknown parameter or diversion_holding_time is not less than 
+                    holding_duration.
+
+    """
+    parameters = parameters or {}
+    unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"unknown parameters: {sorted(unknown)}")
+    parameters = {**DEFAULT_PARAMETERS, **parameters}
+    # an aircraft that holds for holding_duration has a holding violation (even if it diverts after that)
+    if parameters['diversion_holding_time'] is not None and parameters['diversion_holding_time'] >= parameters['holding_duration']:
+        raise ValueError("diversion_holding_time should be less than holding_duration")
+    return parameters
+
+
+def create_aircraft_info(cruise_speed: (int, float), capacity: int, parameters: dict = None) -> dict:
+    """
+    This function creates aircraft info dict that contains its capacity, cruise speed and etc. .
+    Other physical constants are taken from "parameters" (see create_parameters).
+    """
+    parameters = create_parameters(parameters)
+    return {1:{'climb_speed':parameters['climb_speed'], 'climb_rate':parameters['aircraft_climb_rate'], 
+               'cruise_altitude':parameters['cruise_altitude'], 'cruise_speed':cruise_speed,
+               'descent_speed':parameters['descent_speed'], 'descent_rate':parameters['aircraft_descent_rate'], 
+               'capacity':capacity}}
+
+
+def load_max_station_time_data(file_name: str = 'max_station_time.p') -> dict:
+    """
+    This function loads max station time data (created by create_max_station_time_file.py).
+    """
+    with open(file_name, 'rb') as file:
+        return pk.load(file)
+
+
+def calc_kpis(vertiports: list, demands: list, msg_list: list, capacity: int, summary: DemandSummary = None) -> dict:
+    """
+    This function calculates KPIs of a finished simulation. If the simulation was stopped 
+    by an error (msg_list is not empty) all KPIs will be None. Demands' KPIs are taken from
+    "summary" instead of "demands" if it is given (streamed demands, see demand_stream.py).
+
+    Returns:
+        kpis (dict): total_demands, satisfied_demands (percent), cost, cost_per_demand, 
+            cost_per_aircraft, mean_flight_delay, mean_flight_hours, passenger_per_flight and diversions.
+
+    """
+    if msg_list:
+        return {'total_demands':None, 'satisfied_demands': None, 'cost':None, 'cost_per_demand':None, 
+                'cost_per_aircraft':None, 'mean_flight_delay': None, 'mean_flight_hours':None, 
+                'passenger_per_flight':None, 'diversions':None}
+    if summary is None:
+        total_demands = len(demands)
+        satisfied_demands_percent, satisfied_demands = calc_satisfied_percent(demands)
+        mean_flight_delay = calc_mean_flight_delay(demands)
+    else:
+        total_demands = summary.total_demands
+        satisfied_demands_percent, satisfied_demands = summary.satisfied_percent()
+        mean_flight_delay = summary.mean_flight_delay()
+    cost, number_of_aircraft = calc_cost(vertiports, capacity)
+    if not satisfied_demands or not number_of_aircraft:
+        cost_per_demand, cost_per_aircraft = 0, 0
+    else:
+        cost_per_demand, cost_per_aircraft = cost / satisfied_demands, cost / number_of_aircraft
+    mean_flight_hours = calc_mean_flight_hours(vertiports)
+    number_of_flights = calc_number_of_flights(vertiports)
+    passenger_per_flight = satisfied_demands / number_of_flights
+    return {'total_demands':total_demands, 'satisfied_demands':satisfied_demands_percent,
+            'cost':cost, 'cost_per_demand':cost_per_demand, 'cost_per_aircraft':cost_per_aircraft,
+            'mean_flight_delay': mean_flight_delay, 'mean_flight_hours':mean_flight_hours,
+            'passenger_per_flight':passenger_per_flight, 'diversions':calc_number_of_diversions(vertiports)}
+
+
+def simulate_demand(mode: str, cruise_speed: (int, float), capacity: int, vertiports: list, last_id: int, 
+                    demand_number: int, maximum_wait_time: (float, int), max_station_time_data: dict, 
+                    seed: (int, None) = None, keep_objects: bool = True, parameters: dict = None, 
+                    telemetry_path: str = None, rng: np.random.Generator = None) -> dict:
+    """
+    This function runs one simulation with "demand_number" demands on an already built network
+    and returns its data in the same form that run_main stores for each demand number.
+
+    Args:
+        vertiports (list): vertiport objects built by create_vertiport (they will be changed).
+        last_id (int): last objects id returned by create_vertiport.
+        demand_number (int): total number of demands (of each day).
+        max_station_time_data (dict): loaded max station time data.
+        seed ((int, None)): seed of the random demand schedule. None uses current random state.
+        keep_objects (bool): store demand and vertiport objects in the output or not (demands of 
+                             multi-day simulations are never stored).
+        parameters (dict): physical constants (see run_main). Default is None.
+        telemetry_path (str): path of telemetry files (see telemetry.py). Default is None (no telemetry).
+        rng (np.random.Generator): random generator of the demand schedule that is used instead of "seed" 
+                                   (see common_random_numbers.py). Default is None.
+        Other arguments are described in run_main.
+
+    Returns:
+        out_data (dict): KPIs of the simulation (see calc_kpis) alongside demands and vertiports. 
+                         Steady state KPIs are added if steady_state_tolerance is given.
+
+    """
+    parameters = create_parameters(parameters)
+    aircraft_info = create_aircraft_info(cruise_speed, capacity, parameters)
+    start_time = parameters['start_time']
+    end_time = parameters['end_time']
+    simulation_end_time = end_time + (parameters['days'] - 1) * DAY + parameters['end_margin']
+    if seed is not None and rng is None:
+        np.random.seed(seed)
+    summary = None
+    if parameters['days'] == 1:
+        # creating demand schedule info
+        demand_schedule_data = create_schedule(vertiports, demand_number, start_time, end_time, rng)
+        # creating demand objects
+        demands, last_id = create_demands(demand_schedule_data, last_id)
+    else:
+        # demands of each day are created when they are needed and finished ones are released
+        demands = generate_demands(vertiports, demand_number, start_time, end_time, parameters['days'], last_id, rng)
+        summary = DemandSummary()
+    telemetry = None
+    if telemetry_path:
+        telemetry = TelemetryRecorder(telemetry_path, vertiports, start_time, simulation_end_time, 
+                                      parameters['telemetry_interval'])
+    steady_state = None
+    demand_sink = summary
+    if parameters['steady_state_tolerance'] is not None:
+        steady_state = SteadyStateMonitor(start_time, tolerance=parameters['steady_state_tolerance'])
+        if summary is not None:
+            def summary_and_steady_state(demand):
+                summary(demand)
+                steady_state.record(demand)
+            demand_sink = summary_and_steady_state
+    # running simultion
+    vertiports, demands, msg_list, current_epoch = run_simulation(mode, vertiports, demands, parameters['landing_occupation_time'], 
+                                                                  parameters['takeoff_occupation_time'], parameters['battery_swap_time'], 
+                                                                  parameters['board_time_per_passenger'], parameters['deboard_time_per_passenger'], 
+                                                                  parameters['holding_duration'], aircraft_info, max_station_time_data, 
+                                                                  maximum_wait_time, start_time, simulation_end_time,
+                                                                  telemetry=telemetry, diversion_holding_time=parameters['diversion_holding_time'],
+                                                                  demand_sink=demand_sink, steady_state=steady_state)
+    out_data = calc_kpis(vertiports, demands, msg_list, capacity, summary)
+    failed = bool(msg_list)
+    if steady_state is not None and failed:
+        # failed simulations have the same KPIs as other simulations (e.g. columns of exported results)
+        out_data.update({kpi: None for kpi in STEADY_STATE_KPIS})
+    elif steady_state is not None:
+        if steady_state.stop_epoch is not None:
+            # the simulation did not reach the end of its window, so only steady state KPIs are valid
+            out_data.update({kpi: None for kpi in out_data})
+        out_data.update(steady_state.kpis(demands if summary is None else None))
+    out_data['demands'] = demands if keep_objects and not failed and summary is None else None
+    out_data['vertiports'] = vertiports if keep_objects and not failed else None
+    return out_data
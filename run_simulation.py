@@ -1,7 +1,11 @@
 import numpy as np
+from bisect import bisect_left, bisect_right
 from math import sqrt
 from copy import deepcopy
 from objects import Vertiport, Aircraft
+from telemetry import TelemetryRecorder
+from spatial_index import VertiportIndex
+from departure_policies import DeparturePolicy, resolve_departure_policy
 
 
 def object_finder(objects: list, attribute_dict: dict):
@@ -134,24 +138,28 @@ def find_empty_pad(vertiport: Vertiport) -> (None, int):
     return None
 
 
-def demand_status_change_in_aircraft(status: str, aircraft: Aircraft, demands: list) -> list:
+def demand_status_change_in_aircraft(status: str, aircraft: Aircraft, demand_map: dict) -> dict:
     """
     This function change status of all demands in an aircraft.
+
+    Args:
+        demand_map (dict): demand objects by their id_.
     """
     for demand_id in aircraft.demands:
-        demand_obj = object_finder(demands, {'id_':demand_id})[0]
-        demand_obj.status = status
-    return demands
+        demand_map[demand_id].status = status
+    return demand_map
 
 
-def find_maximum_flight_delay_in_aircraft_demands(aircraft: Aircraft, demands: list) -> int:
+def find_maximum_flight_delay_in_aircraft_demands(aircraft: Aircraft, demand_map: dict) -> int:
     """
     This function finds max flight delay in passengers on an aircraft.
+
+    Args:
+        demand_map (dict): demand objects by their id_.
     """
     temp = []
     for demand_id in aircraft.demands:
-        demand_obj = object_finder(demands, {'id_':demand_id})[0]
-        temp.append(demand_obj.delayed_at['flight_delay'])
+        temp.append(demand_map[demand_id].delayed_at['flight_delay'])
     if not temp:
         return 0
     return max(temp)
@@ -191,7 +199,7 @@ def get_vertiport_max_station_time(max_station_time_data: dict, vertiport: Verti
     This function calculates max time on station for aircraft.
 
     Args:
-        max_station_time_data (dict): DESCRIPTION.
+        max_station_time_data (dict): DESCRIPTION (or a StationTimeGrid of shared_network.py).
         vertiport (Vertiport): DESCRIPTION.
         aircraft_rate_per_hour (float): DESCRIPTION.
 
@@ -201,8 +209,11 @@ def get_vertiport_max_station_time(max_station_time_data: dict, vertiport: Verti
     """
     occupied_capacity = calc_occupied_capacity(vertiport)
     considered_capacity = int(vertiport.capacity - occupied_capacity +1)
-    max_station_times = list(max_station_time_data[considered_capacity].values())
-    aircraft_rates = list(max_station_time_data[considered_capacity].keys())
+    if isinstance(max_station_time_data, dict):
+        max_station_times = list(max_station_time_data[considered_capacity].values())
+        aircraft_rates = list(max_station_time_data[considered_capacity].keys())
+    else: # a StationTimeGrid (see shared_network.py)
+        aircraft_rates, max_station_times = max_station_time_data.table(considered_capacity)
     max_station_time = np.interp(aircraft_rate_per_hour, aircraft_rates, max_station_times)
     return max_station_time
 
@@ -217,41 +228,26 @@ def calc_aircraft_arrive_rate_for_vertiport(start_epoch: int, current_epoch: int
         period (int): period of time that will be the basis to calc rate in seconds.
     """
     
+    # arriving epochs are appended in time order, so they are counted by binary search
     arriving_spochs = vertiport.arriving_spochs
-    temp_epochs = [i for i in arriving_spochs if current_epoch - period < i < current_epoch]
+    number_of_arrivals = bisect_left(arriving_spochs, current_epoch) - bisect_right(arriving_spochs, current_epoch - period)
     if current_epoch == start_epoch:
         return 0
     if current_epoch - period < start_epoch:
-        rate = (period / (current_epoch - start_epoch))*len(temp_epochs)
+        rate = (period / (current_epoch - start_epoch))*number_of_arrivals
     else:
-        rate = len(temp_epochs)
+        rate = number_of_arrivals
     return rate
 
 
-def determine_time_to_go(mode: str, aircraft: Aircraft, maximum_flight_delay_in_aircraft: int, 
+def determine_time_to_go(mode: (str, DeparturePolicy), aircraft: Aircraft, maximum_flight_delay_in_aircraft: int, 
                          maximum_wait_time: int, max_station_time: int) -> bool:
     """
     This function determine that aircraft should leave the vertiport or not (base on mode).
+    Simulations resolve their departure policy once (see departure_policies.py) instead of this function.
     """
-    if aircraft.boarding_time:
-        return False
-    capacity_flag = aircraft.capacity == len(aircraft.demands)
-    wait_flag = maximum_flight_delay_in_aircraft >= maximum_wait_time
-    station_time_flag = aircraft.time_on_vertiport > max_station_time
-    if aircraft.status.lower() in ['occupied', 'ready']:
-        if mode.lower() == 'wait':
-            if wait_flag or capacity_flag:
-                return True
-        elif mode.lower() == 'capacity':
-            if capacity_flag:
-                return True
-        elif mode.lower() == 'capacity_station':
-            if capacity_flag or station_time_flag:
-                return True
-        elif mode.lower() == 'station_wait':
-            if capacity_flag or station_time_flag or wait_flag:
-                return True
-    return False
+    return resolve_departure_policy(mode).should_depart(aircraft, maximum_flight_delay_in_aircraft, 
+                                                        maximum_wait_time, max_station_time)
 
 
 def determine_suitable_destination(vertiports: list, origin_vertiport: Vertiport) -> (int, None):
@@ -282,25 +278,72 @@ def calc_aircraft_turnaround_time(aircraft: Aircraft, battery_swap_time: int,
     return max(battery_swap_time, time_to_deboard)
 
 
-def physics_module(mode: str, time_step: int, vertiports: list, demands: list, 
+def is_diversion_candidate(vertiport: Vertiport) -> bool:
+    """
+    This function checks if an aircraft can divert to a vertiport. Vertiport should have an empty pad
+    and enough capacity and it should not have holding aircraft (they are served first).
+    """
+    occupied_capacity = calc_occupied_capacity(vertiport)
+    return find_empty_pad(vertiport) is not None and occupied_capacity < vertiport.capacity and not vertiport.holding_aircrafts
+
+
+def divert_aircraft(aircraft: Aircraft, destination_obj: Vertiport, current_epoch: int, aircraft_info: dict, 
+                    vertiport_index: VertiportIndex) -> bool:
+    """
+    This function diverts a holding aircraft to the nearest vertiport (to its destination) that has 
+    an empty pad and enough capacity. The aircraft will cruise to its new destination and its 
+    passengers will be "diverted" after landing.
+
+    Returns:
+        diverted (bool): True if a vertiport is found and aircraft is diverted.
+
+    """
+    alternate_obj = vertiport_index.nearest(destination_obj.position, 
+                                            lambda vertiport: vertiport.id_ != destination_obj.id_ and is_diversion_candidate(vertiport))
+    if alternate_obj is None:
+        return False
+    del destination_obj.holding_aircrafts[destination_obj.holding_aircrafts.index(aircraft.id_)]
+    destination_obj.diverted_aircrafts.append({'time':current_epoch, 'id_':aircraft.id_, 'to':alternate_obj.id_})
+    # previous cruise and holding are kept (for flight hours) but new ones will be found by their type
+    holding_schedule = find_object_schedule_by_type(aircraft, 'holding')
+    holding_schedule['t_f'] = current_epoch
+    holding_schedule['type'] = 'holding_before_diversion'
+    find_object_schedule_by_type(aircraft, 'cruise')['type'] = 'cruise_before_diversion'
+    cruise_distance = distnace_calculator(destination_obj.position, alternate_obj.position)
+    cruise_duration = (cruise_distance/aircraft_info[aircraft.db_id]['cruise_speed'])*3600
+    aircraft.schedule_list.append({'t_0':current_epoch, 't_f': current_epoch + cruise_duration, 'type':'cruise', 
+                                   'distance':cruise_distance})
+    if aircraft.diverted_from is None:
+        aircraft.diverted_from = destination_obj.id_
+    aircraft.destination_id = alternate_obj.id_
+    aircraft.status = 'cruise'
+    return True
+
+
+def physics_module(mode: (str, DeparturePolicy), time_step: int, vertiports: list, demands: list, 
                    current_epoch: int, landing_occupation_time: int, 
                    takeoff_occupation_time: int, battery_swap_time: int, 
                    board_time_per_passenger: int, deboard_time_per_passenger: int, 
                    holding_duration: int, aircraft_info: dict, max_station_time_data: dict, 
-                   maximum_wait_time: int, start_epoch: int) -> (list, list, int):
+                   maximum_wait_time: int, start_epoch: int, telemetry: TelemetryRecorder = None, 
+                   diversion_holding_time: int = None, vertiport_index: VertiportIndex = None) -> (list, list, int):
     """
     This function acts as a manager fot objects. This function moves aircrafts, 
     manage demands, and collect simulation's data.
     All Arguments' description is available in run_simulation module in this file.
     """
+    policy = resolve_departure_policy(mode)
     msg_list = []
     super_holding_violation = False
+    # objects are found by their id_ in these maps instead of searching their lists
+    vertiport_map = {vertiport.id_: vertiport for vertiport in vertiports}
+    demand_map = {demand.id_: demand for demand in demands}
     for demand in demands:
         if demand.status.lower() == 'scheduled':
-            if 'wait' in mode.lower() and demand.delayed_at['flight_delay'] > maximum_wait_time:
+            if policy.expire_waiting_demands and demand.delayed_at['flight_delay'] > maximum_wait_time:
                 demand.status = 'unsuccessful'
             if current_epoch > demand.start_time:
-                vertiport_obj = object_finder(vertiports, {'id_':demand.origin_id})[0]
+                vertiport_obj = vertiport_map[demand.origin_id]
                 find_aircraft = False
                 for aircraft in vertiport_obj.aircrafts:
                     if aircraft.destination_id == demand.destination_id and len(aircraft.demands) < aircraft.capacity and aircraft.status.lower() in ['ready', 'occupied']:
@@ -328,6 +371,7 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
             demand.delayed_at['flight_delay'] = max(0, current_epoch - demand.start_time)
     number_of_aircrafts = 0
     holding_violations = 0
+    tick_gauges = {}
     for vertiport in vertiports:
         occupied_capacity = calc_occupied_capacity(vertiport)
         aircraft_rate_per_hour = calc_aircraft_arrive_rate_for_vertiport(start_epoch, current_epoch, vertiport, 3600)
@@ -336,6 +380,7 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
         else:
             max_station_time = np.inf
         number_of_aircrafts += len(vertiport.aircrafts)
+        departure_queue = 0
         for aircraft in vertiport.aircrafts:
             if aircraft.boarding_time:
                 aircraft.boarding_time -= time_step
@@ -343,10 +388,8 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
                 holding_violations += 1
             if aircraft.status.lower() in ['ready', 'occupied', 'turnaround']:
                 aircraft.time_on_vertiport += 1
-            maximum_flight_delay_in_aircraft = find_maximum_flight_delay_in_aircraft_demands(aircraft, demands)
-            time_to_go_flag = determine_time_to_go(mode, aircraft, maximum_flight_delay_in_aircraft, maximum_wait_time, max_station_time)
-            if not time_to_go_flag and maximum_flight_delay_in_aircraft > 2* maximum_wait_time:
-                time_to_go_flag = determine_time_to_go(mode, aircraft, maximum_flight_delay_in_aircraft, maximum_wait_time, max_station_time)
+            maximum_flight_delay_in_aircraft = find_maximum_flight_delay_in_aircraft_demands(aircraft, demand_map)
+            time_to_go_flag = policy.should_depart(aircraft, maximum_flight_delay_in_aircraft, maximum_wait_time, max_station_time)
             if time_to_go_flag:
                 pad_id = find_empty_pad(vertiport)
                 if pad_id is not None:
@@ -359,12 +402,12 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
                                                                                    current_epoch, takeoff_occupation_time, vertiports)
                     aircraft.schedule_list += flight_schedule
                     aircraft.status = pad_obj.status = 'takeoff'
-                    demands = demand_status_change_in_aircraft('airborne', aircraft, demands)
+                    demand_status_change_in_aircraft('airborne', aircraft, demand_map)
                     takeoff_schedule = find_object_schedule_by_type(aircraft, 'takeoff')
                 else:
+                    departure_queue += 1
                     for demand_id in aircraft.demands:
-                        demand_obj = object_finder(demands, {'id_':demand_id})[0]
-                        demand_obj.delayed_at['before_takeoff'] += 1
+                        demand_map[demand_id].delayed_at['before_takeoff'] += 1
             elif aircraft.status.lower() == 'takeoff':
                 aircraft.time_on_vertiport = 0
                 takeoff_schedule = find_object_schedule_by_type(aircraft, 'takeoff')
@@ -380,7 +423,7 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
             elif aircraft.status.lower() == 'cruise':
                 cruise_schedule = find_object_schedule_by_type(aircraft, 'cruise')
                 if current_epoch >= cruise_schedule['t_f']:
-                    destination_obj = object_finder(vertiports, {'id_':aircraft.destination_id})[0]
+                    destination_obj = vertiport_map[aircraft.destination_id]
                     destination_obj.arriving_aircrafts.append({'time':current_epoch, 'id_':aircraft.id_})
                     destination_obj.arriving_spochs.append(current_epoch)
                     pad_id = find_empty_pad(destination_obj)
@@ -404,12 +447,14 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
                     if (current_epoch - holding_schedule['t_f']) > 2 * (holding_schedule['t_f'] -  holding_schedule['t_0']):
                         super_holding_violation = True
                 for demand_id in aircraft.demands:
-                    demand_obj = object_finder(demands, {'id_':demand_id})[0]
-                    demand_obj.delayed_at['before_landing'] += 1
-                destination_obj = object_finder(vertiports, {'id_':aircraft.destination_id})[0]
+                    demand_map[demand_id].delayed_at['before_landing'] += 1
+                destination_obj = vertiport_map[aircraft.destination_id]
                 vertiport_state = check_vertiport_capacity(aircraft, destination_obj) 
                 pad_id = find_empty_pad(destination_obj)
-                if pad_id is not None and vertiport_state:
+                if (pad_id is None or not vertiport_state) and diversion_holding_time is not None and \
+                        current_epoch - holding_schedule['t_0'] >= diversion_holding_time:
+                    divert_aircraft(aircraft, destination_obj, current_epoch, aircraft_info, vertiport_index)
+                elif pad_id is not None and vertiport_state:
                     del destination_obj.holding_aircrafts[destination_obj.holding_aircrafts.index(aircraft.id_)]
                     aircraft.pad_id = pad_id
                     holding_schedule['t_f'] = current_epoch
@@ -421,7 +466,7 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
             elif aircraft.status.lower() == 'landing':
                 landing_schedule = find_object_schedule_by_type(aircraft, 'landing')
                 if current_epoch >= landing_schedule['t_f']:
-                    destination_obj = object_finder(vertiports, {'id_':aircraft.destination_id})[0]
+                    destination_obj = vertiport_map[aircraft.destination_id]
                     pad_obj = object_finder(destination_obj.pads, {'id_':aircraft.pad_id})[0]
                     aircraft.pad_id = None
                     pad_obj.status = 'ready'
@@ -429,7 +474,8 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
                     turnaround_time = calc_aircraft_turnaround_time(aircraft, battery_swap_time, deboard_time_per_passenger)
                     aircraft.schedule_list += [{'t_0':current_epoch, 't_f': current_epoch + turnaround_time, 
                                                 'type':'turnaround', 'distance':0}]
-                    demands = demand_status_change_in_aircraft('satisfied', aircraft, demands)
+                    demand_status_change_in_aircraft('satisfied' if aircraft.diverted_from is None else 'diverted', 
+                                                     aircraft, demand_map)
             elif aircraft.status.lower() == 'turnaround':
                 turnaround_schedule = find_object_schedule_by_type(aircraft, 'turnaround')
                 if current_epoch >= turnaround_schedule['t_f']:
@@ -440,7 +486,11 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
                     aircraft.demands = []
                     aircraft.destination_id = None
                     aircraft.origin_id = None
-                    
+                    aircraft.diverted_from = None
+        tick_gauges[vertiport.id_] = {'departure_queue': departure_queue, 'aircraft_arrive_rate': aircraft_rate_per_hour,
+                                      'max_station_time': max_station_time}
+    if telemetry is not None:
+        telemetry.record(current_epoch, vertiports, demands, tick_gauges)
     if holding_violations >= 0.1 * number_of_aircrafts:
         msg_list.append('too much holding violations')
     if super_holding_violation:
@@ -449,11 +499,58 @@ def physics_module(mode: str, time_step: int, vertiports: list, demands: list,
         
                     
 
-def run_simulation(mode: str, vertiports: list, demands: list, landing_occupation_time: int, 
+# statuses of demands that will not change anymore
+FINISHED_STATUSES = ['satisfied', 'diverted', 'unsuccessful']
+
+
+def release_finished_demands(vertiports: list, demands: list, demand_sink) -> list:
+    """
+    This function passes finished demands to demand_sink and removes them from the list of demands.
+    Demands of aircraft that have not finished their turnaround are kept, because their delays
+    are still used by their aircraft.
+
+    Args:
+        vertiports (list): list of vertiport objects.
+        demands (list): list of demand objects.
+        demand_sink (callable): a function that gets a finished demand object.
+
+    Returns:
+        demands (list): list of demand objects that are not finished.
+
+    """
+    carried_demands = set()
+    for vertiport in vertiports:
+        for aircraft in vertiport.aircrafts:
+            carried_demands.update(aircraft.demands)
+    active_demands = []
+    for demand in demands:
+        if demand.status.lower() in FINISHED_STATUSES and demand.id_ not in carried_demands:
+            demand_sink(demand)
+        else:
+            active_demands.append(demand)
+    return active_demands
+
+
+def release_old_arrivals(vertiports: list, current_epoch: int, period: int = 3600) -> None:
+    """
+    This function removes arrivals that are older than "period" (they are not used in arrive
+    rate anymore) and counts them in released_arrivals of their vertiport.
+    """
+    for vertiport in vertiports:
+        old_arrivals = sum(1 for arrival in vertiport.arriving_aircrafts if arrival['time'] <= current_epoch - period)
+        if old_arrivals:
+            vertiport.arriving_aircrafts = vertiport.arriving_aircrafts[old_arrivals:]
+            vertiport.released_arrivals += old_arrivals
+        vertiport.arriving_spochs = [i for i in vertiport.arriving_spochs if i > current_epoch - period]
+
+
+def run_simulation(mode: (str, DeparturePolicy), vertiports: list, demands: list, landing_occupation_time: int, 
                    takeoff_occupation_time: int, battery_swap_time: int, 
                    board_time_per_passenger: int, deboard_time_per_passenger: int, \
                    holding_duration: int, aircraft_info: dict, max_station_time_data: dict, 
-                   maximum_wait_time: int, start_time: int, end_time: int) -> (list, list, list, int):
+                   maximum_wait_time: int, start_time: int, end_time: int, 
+                   telemetry: TelemetryRecorder = None, diversion_holding_time: int = None, 
+                   observer=None, demand_sink=None, steady_state=None) -> (list, list, list, int):
     """
     This function runs a simulation for a vertiport network between "start_time" and "end_time".
     Having a list of demand that is based on vertiport objects and their arrival time is between 
@@ -466,8 +563,11 @@ def run_simulation(mode: str, vertiports: list, demands: list, landing_occupatio
                         2- capacity method with max time on station: "capacity_station"
                         3- wait time method: "wait"
                         4- wait time method with max time on station: "station_wait"
+                    or the name (or an object) of another departure policy (see departure_policies.py).
         vertiports (list): list of vertiport objects.
-        demands (list): list of demand objects.
+        demands (list): list of demand objects, or an iterator (e.g. a generator, see demand_stream.py) 
+                        of demand objects sorted by their start time. Demands of an iterator are 
+                        read when they start, so they are not kept in memory before that.
         landing_occupation_time (int): required time for an aircraft to descent, land and to leave a 
                                        landing pad in seconds.
         takeoff_occupation_time (int): required time for an aircraft to finish its takeoff sequences 
@@ -481,10 +581,27 @@ def run_simulation(mode: str, vertiports: list, demands: list, landing_occupatio
         maximum_wait_time (int):  Max wait time for passengers for an aircraft.
         start_time (int): start time of simulation.
         end_time (int): end time of simulation.
+        telemetry (TelemetryRecorder): recorder of vertiports' gauges (see telemetry.py). Default is None.
+        diversion_holding_time (int): holding time (in seconds) after which a holding aircraft diverts to 
+                                      the nearest vertiport with an empty pad and enough capacity. 
+                                      It should be less than holding_duration, because holding longer 
+                                      than holding_duration is a holding violation. Default is None 
+                                      (no diversion).
+        observer (callable): a function that will be called after every tick in this form:
+                             observer(current_epoch, vertiports, demands). Default is None.
+        demand_sink (callable): a function that gets every demand object once: finished demands 
+                                (satisfied, diverted or unsuccessful) after the tick in which they finish, 
+                                and other demands at the end of simulation. Passed demands are removed from 
+                                the simulation (and old arrivals of vertiports are counted and removed), 
+                                so memory does not grow with the number of days. Default is None 
+                                (all demands are kept).
+        steady_state (SteadyStateMonitor): a monitor of warm-up and steady state that can stop the simulation 
+                                           (see steady_state.py). Default is None.
 
     Returns:
         vertiports (dict): list of vertiport objects after simulation.
-        demands (int):  list of demand objects after simulation.
+        demands (int):  list of demand objects after simulation (only demands that are not 
+                        finished if demand_sink is used).
         msg_list (int): list of messages. if there is an error in the simulation, 
                         a message will appear in this list.
         current_epoch (int): last epoch of simulation.
@@ -494,12 +611,36 @@ def run_simulation(mode: str, vertiports: list, demands: list, landing_occupatio
     
     current_epoch = start_time
     time_step = 30
+    mode = resolve_departure_policy(mode)
+    vertiport_index = VertiportIndex(vertiports) if diversion_holding_time is not None else None
+    streaming = not isinstance(demands, list)
+    if streaming:
+        demand_stream = iter(demands)
+        demands = []
+        next_demand = next(demand_stream, None)
     while current_epoch <= end_time:
+        # a demand does not change before its start time, so it is added at the first tick after that
+        while streaming and next_demand is not None and next_demand.start_time < current_epoch:
+            demands.append(next_demand)
+            next_demand = next(demand_stream, None)
+            if next_demand is not None and next_demand.start_time < demands[-1].start_time:
+                raise ValueError("demands of an iterator should be sorted by their start time")
         vertiports, demands, msg_list = physics_module(mode, time_step, vertiports, demands, current_epoch, landing_occupation_time, takeoff_occupation_time, battery_swap_time, board_time_per_passenger, deboard_time_per_passenger, \
-                                                           holding_duration, aircraft_info, max_station_time_data, maximum_wait_time, start_time)
-          
-        if msg_list:
+                                                           holding_duration, aircraft_info, max_station_time_data, maximum_wait_time, start_time, telemetry, \
+                                                           diversion_holding_time, vertiport_index)
+        if observer is not None:
+            observer(current_epoch, vertiports, demands)
+        steady_state_flag = steady_state is not None and steady_state.update(current_epoch, vertiports, demands)
+        if demand_sink is not None:
+            demands = release_finished_demands(vertiports, demands, demand_sink)
+            release_old_arrivals(vertiports, current_epoch)
+        if msg_list or steady_state_flag:
             break
         current_epoch += time_step
+    if demand_sink is not None:
+        for demand in demands:
+            demand_sink(demand)
+    if telemetry is not None:
+        telemetry.flush()
     return vertiports, demands, msg_list, current_epoch
         
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Read-only network data that is shared by worker processes without copies. A network (vertiports'
+ids, positions, capacities, pads and aircraft) and max station time data are published once as memory-mapped .npy files (in /dev/shm when it is
+available, so they stay in memory) and every worker attaches to them by their path, which is small
+and picklable. The pages of the arrays are shared by all processes on a host:
+
+    path = publish_network(vertiports, last_id, max_station_time_data)
+    # in a worker process:
+    network = attach_network(path)
+    vertiports, last_id = network.create_vertiports(aircraft_info)      # fresh objects for a simulation
+    run_simulation(..., vertiports, ..., network.station_time_grid, ...)
+    # after all workers are finished:
+    remove_network(path)
+
+Vertiport objects of a network have the same ids as the published ones, so simulations are the same
+as simulations of the original objects.
+"""
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from objects import Vertiport, Pad, Aircraft
+
+# attached networks of this process by their path
+_attached = {}
+
+
+def _number(value: float) -> (int, float):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class StationTimeGrid:
+    def __init__(self, capacities: np.ndarray, aircraft_rates: np.ndarray, max_station_times: np.ndarray):
+        """
+        Max station time data (created by create_max_station_time_file.py) as a grid of
+        (considered capacity, aircraft rate) that get_vertiport_max_station_time accepts instead of
+        the dict of the max station time file.
+
+        Args:
+            capacities (np.ndarray): considered capacities of grid rows.
+            aircraft_rates (np.ndarray): aircraft rates per hour of grid columns.
+            max_station_times (np.ndarray): max station times with (capacity, aircraft rate) shape.
+        """
+        self.capacities = capacities
+        self.aircraft_rates = aircraft_rates
+        self.max_station_times = max_station_times
+        self.rows = {int(capacity): row for row, capacity in enumerate(capacities)}
+
+    @classmethod
+    def from_data(cls, max_station_time_data: dict):
+        """
+        This function creates a grid from max station time data.
+
+        Raises:
+            ValueError: if capacities of the data do not have the same aircraft rates.
+
+        """
+        capacities = list(max_station_time_data)
+        aircraft_rates = list(max_station_time_data[capacities[0]])
+        for capacity in capacities:
+            if list(max_station_time_data[capacity]) != aircraft_rates:
+                raise ValueError("every capacity of max station time data should have the same aircraft rates")
+        max_station_times = [list(max_station_time_data[capacity].values()) for capacity in capacities]
+        return cls(np.array(capacities), np.array(aircraft_rates, dtype=float), np.array(max_station_times, dtype=float))
+
+    def table(self, capacity: int) -> (np.ndarray, np.ndarray):
+        """
+        This function returns aircraft rates and max station times of a considered capacity.
+        """
+        return self.aircraft_rates, self.max_station_times[self.rows[capacity]]
+
+
+def publish_network(vertiports: list, last_id: int, max_station_time_data: dict, path: str = None) -> str:
+    """
+    This function publishes a network and max station time data as memory-mapped files.
+
+    Args:
+        vertiports (list): vertiport objects (before simulation) built by create_vertiport or create_network.
+        last_id (int): last objects id returned by create_vertiport.
+        max_station_time_data (dict): loaded max station time data.
+        path (str): directory of the files. Default is None (a new directory in /dev/shm or temp directory).
+
+    Returns:
+        path (str): path of the network that workers attach to.
+
+    """
+    if path is None:
+        path = tempfile.mkdtemp(prefix='uam_network_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    os.makedirs(path, exist_ok=True)
+    grid = StationTimeGrid.from_data(max_station_time_data)
+    arrays = {'vertiport_ids': np.array([vertiport.id_ for vertiport in vertiports], dtype=np.int64),
+              'positions': np.array([vertiport.position for vertiport in vertiports], dtype=float).reshape(-1, 2),
+              'capacities': np.array([vertiport.capacity for vertiport in vertiports], dtype=float),
+              'pad_ids': np.array([pad.id_ for vertiport in vertiports for pad in vertiport.pads], dtype=np.int64),
+              'pad_vertiports': np.array([index for index, vertiport in enumerate(vertiports) for _ in vertiport.pads], dtype=np.int64),
+              'aircraft_ids': np.array([aircraft.id_ for vertiport in vertiports for aircraft in vertiport.aircrafts], dtype=np.int64),
+              'aircraft_db_ids': np.array([aircraft.db_id for vertiport in vertiports for aircraft in vertiport.aircrafts], dtype=np.int64),
+              'aircraft_vertiports': np.array([index for index, vertiport in enumerate(vertiports) for _ in vertiport.aircrafts], dtype=np.int64),
+              'station_time_capacities': grid.capacities,
+              'station_time_aircraft_rates': grid.aircraft_rates,
+              'max_station_times': grid.max_station_times}
+    for name, array in arrays.items():
+        out = np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode='w+', dtype=array.dtype, shape=array.shape)
+        out[...] = array
+        out.flush()
+        del out
+    meta = {'names': [vertiport.name for vertiport in vertiports],
+            'pad_names': [pad.name for vertiport in vertiports for pad in vertiport.pads],
+            'last_id': last_id, 'arrays': list(arrays)}
+    with open(os.path.join(path, 'network.json'), 'w') as file:
+        json.dump(meta, file)
+    return path
+
+
+class SharedNetwork:
+    def __init__(self, path: str):
+        """
+        A read-only view of a published network (see publish_network). Its arrays are attributes
+        with the same names as the files of the network.
+        """
+        self.path = path
+        with open(os.path.join(path, 'network.json')) as file:
+            self.meta = json.load(file)
+        for name in self.meta['arrays']:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+        self.station_time_grid = StationTimeGrid(self.station_time_capacities, self.station_time_aircraft_rates,
+                                                 self.max_station_times)
+
+    def create_vertiports(self, aircraft_info: dict) -> (list, int):
+        """
+        This function creates fresh vertiport objects of the network alongside their aircraft and pads.
+
+        Returns:
+            vertiport_objects (list): list of built vertiport objects.
+            last_id (int): last objects id, to be used for creating other objects.
+
+        """
+        vertiport_objects = [Vertiport(int(id_), [], [], [_number(x), _number(y)], name, _number(capacity))
+                             for id_, (x, y), name, capacity in zip(self.vertiport_ids, self.positions,
+                                                                     self.meta['names'], self.capacities)]
+        for id_, index, name in zip(self.pad_ids, self.pad_vertiports, self.meta['pad_names']):
+            vertiport_objects[index].pads.append(Pad(int(id_), name))
+        for id_, db_id, index in zip(self.aircraft_ids, self.aircraft_db_ids, self.aircraft_vertiports):
+            vertiport_objects[index].aircrafts.append(Aircraft(int(id_), int(db_id), None, 'ready', [], aircraft_info[int(db_id)]['capacity']))
+        return vertiport_objects, self.meta['last_id']
+
+
+def attach_network(path: str) -> SharedNetwork:
+    """
+    This function attaches to a published network (only once in a process).
+    """
+    if path not in _attached:
+        _attached[path] = SharedNetwork(path)
+    return _attached[path]
+
+
+def remove_network(path: str) -> None:
+    """
+    This function removes files of a published network (attached processes can still use it until they
+    detach).
+    """
+    _attached.pop(path, None)
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,283 @@
+"""
+A long-running local simulation service. It keeps parsed networks and max station time data
+warm in its worker processes and accepts scenario jobs over a local HTTP API:
+
+    POST   /jobs               submit a job (json body, see JOB_FIELDS), returns its id.
+    GET    /jobs               list all jobs and their status.
+    GET    /jobs/<id>          status and finished runs' KPIs of a job.
+    GET    /jobs/<id>/events   stream of json lines: one line for each finished run and a last
+                               line when the job is finished.
+    DELETE /jobs/<id>          cancel a job (runs that are not started will not run).
+
+Every job is expanded into runs (one run for each demand number and seed) and runs are
+scheduled on a process pool with asyncio. Networks and max station time data of jobs are published
+once as shared memory-mapped arrays (see shared_network.py), so workers do not parse or copy them.
+Published networks are removed when the service stops (SIGINT or SIGTERM).
+You can start the service with:
+    python simulation_service.py --port 8765 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from cli import REQUIRED, fill_fields
+from create_objects import create_vertiport
+from departure_policies import import_policy_modules, resolve_departure_policy
+from result_cache import file_digest
+from run_main import create_parameters, create_aircraft_info, load_max_station_time_data
+from shared_network import publish_network, remove_network
+from simulation_worker import init_worker, run_job
+
+# job fields and their default values
+JOB_FIELDS = {'vertiport_file_name': REQUIRED, 'mode': REQUIRED, 'cruise_speed': REQUIRED, 'capacity': REQUIRED,
+              'maximum_wait_time': REQUIRED, 'start_demand': REQUIRED, 'end_demand': REQUIRED, 'demand_step': 1,
+              'seeds': [None], 'parameters': {}}
+
+def parse_job(data: dict) -> dict:
+    """
+    This function validates a submitted job and fills its default values.
+
+    Raises:
+        ValueError: if a required field is missing or a value is not valid.
+
+    """
+    job = fill_fields(data, JOB_FIELDS, 'job')
+    # modes are names of registered departure policies (see departure_policies.py)
+    resolve_departure_policy(job['mode'])
+    if job['demand_step'] <= 0:
+        raise ValueError("demand_step must be positive")
+    if not isinstance(job['seeds'], list) or not job['seeds']:
+        raise ValueError("seeds must be a non empty list")
+    if not os.path.exists(f"{job['vertiport_file_name']}.xlsx"):
+        raise ValueError(f"vertiport file {job['vertiport_file_name']}.xlsx is not found")
+    create_parameters(job['parameters'])
+    return job
+
+
+class Job:
+    def __init__(self, id_, spec):
+        self.id_ = id_
+        self.spec = spec
+        self.status = 'queued'
+        self.runs = [(demand_number, seed) for demand_number in range(spec['start_demand'], spec['end_demand'] + 1, spec['demand_step'])
+                     for seed in spec['seeds']]
+        self.results = []
+        self.errors = []
+        self.futures = []
+        self.events = []
+        self.new_event = asyncio.Event()
+        self.submit_time = time.time()
+
+    def add_event(self, event: dict) -> None:
+        self.events.append(event)
+        self.new_event.set()
+        self.new_event = asyncio.Event()
+
+    def summary(self, with_results: bool = False) -> dict:
+        out = {'id': self.id_, 'status': self.status, 'job': self.spec, 'total_runs': len(self.runs),
+               'finished_runs': len(self.results), 'failed_runs': len(self.errors)}
+        if with_results:
+            out['results'] = self.results
+            out['errors'] = self.errors
+        return out
+
+
+class SimulationService:
+    def __init__(self, workers: int = None, cache_file: str = None):
+        # workers read max station time data from published networks, so they do not preload it
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_file, False))
+        self.jobs = {}
+        # paths of published networks by (vertiport file name, capacity, max station time file and digests of both files)
+        self.networks = {}
+        self.publish_lock = asyncio.Lock() # a network is published by one job at a time
+
+    def publish(self, spec: dict) -> (str, None):
+        """
+        This function publishes the network of a job (only once for every network, and again if its
+        files are changed). If the network can not be created, None is returned and the runs of the job
+        report the error.
+        """
+        max_station_time_file = create_parameters(spec['parameters'])['max_station_time_file']
+        try:
+            key = (spec['vertiport_file_name'], spec['capacity'], max_station_time_file,
+                   file_digest(f"{spec['vertiport_file_name']}.xlsx"), file_digest(max_station_time_file))
+        except OSError:
+            return None
+        if key not in self.networks:
+            try:
+                vertiports, last_id = create_vertiport(spec['vertiport_file_name'],
+                                                       create_aircraft_info(spec['cruise_speed'], spec['capacity']))
+                self.networks[key] = publish_network(vertiports, last_id, load_max_station_time_data(max_station_time_file))
+            except Exception:
+                return None
+        return self.networks[key]
+
+    async def submit(self, spec: dict) -> Job:
+        """
+        This function creates a job and schedules all of its runs on the worker pool. The network of
+        the job is published in a thread, so reading its file does not block the service.
+        """
+        job = Job(uuid.uuid4().hex[:12], spec)
+        loop = asyncio.get_running_loop()
+        network_path = None
+        if job.runs:
+            async with self.publish_lock:
+                network_path = await loop.run_in_executor(None, self.publish, spec)
+        self.jobs[job.id_] = job
+        for demand_number, seed in job.runs:
+            future = loop.run_in_executor(self.pool, run_job, spec, demand_number, seed, network_path)
+            future.add_done_callback(lambda f, job=job: self._run_done(job, f))
+            job.futures.append(future)
+        if not job.runs:
+            self._finish(job)
+        return job
+
+    def _run_done(self, job: Job, future: asyncio.Future) -> None:
+        if future.cancelled() or job.status == 'cancelled':
+            return
+        job.status = 'running'
+        exception = future.exception()
+        if exception is not None:
+            error = {'error': repr(exception)}
+            job.errors.append(error)
+            job.add_event({'type': 'error', **error})
+        else:
+            job.results.append(future.result())
+            job.add_event({'type': 'run', **future.result()})
+        if len(job.results) + len(job.errors) == len(job.runs):
+            self._finish(job)
+
+    def _finish(self, job: Job) -> None:
+        job.status = 'failed' if job.errors else 'done'
+        job.add_event({'type': 'end', 'status': job.status})
+
+    def cancel(self, job: Job) -> None:
+        """
+        This function cancels all runs of a job that are not started yet.
+        """
+        if job.status in ['done', 'failed', 'cancelled']:
+            return
+        job.status = 'cancelled'
+        for future in job.futures:
+            future.cancel()
+        job.add_event({'type': 'end', 'status': job.status})
+
+    async def events(self, job: Job):
+        """
+        This function yields events of a job (including past ones) until the job is finished.
+        """
+        index = 0
+        while True:
+            while index < len(job.events):
+                yield job.events[index]
+                index += 1
+            if job.events and job.events[-1]['type'] == 'end':
+                return
+            await job.new_event.wait()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        This function handles one http request.
+        """
+        try:
+            request_line = (await reader.readline()).decode().split()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0].upper(), request_line[1].rstrip('/')
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            try:
+                content_length = int(headers.get('content-length', 0))
+            except ValueError:
+                content_length = -1
+            if content_length < 0:
+                return await self.respond(writer, 400, {'error': 'content-length must be a non negative integer'})
+            body = await reader.readexactly(content_length)
+            await self.route(method, path.split('/')[1:], body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, parts: list, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            return await self.respond(writer, 404, {'error': 'not found'})
+        if len(parts) == 1:
+            if method == 'GET':
+                return await self.respond(writer, 200, [job.summary() for job in self.jobs.values()])
+            if method == 'POST':
+                try:
+                    job = await self.submit(parse_job(json.loads(body or b'{}')))
+                except (ValueError, TypeError, AttributeError) as error:
+                    return await self.respond(writer, 400, {'error': str(error)})
+                return await self.respond(writer, 201, job.summary())
+            return await self.respond(writer, 405, {'error': 'method not allowed'})
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return await self.respond(writer, 404, {'error': 'job not found'})
+        if len(parts) == 3:
+            if parts[2] != 'events' or method != 'GET':
+                return await self.respond(writer, 404, {'error': 'not found'})
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n')
+            async for event in self.events(job):
+                writer.write(json.dumps(event).encode() + b'\n')
+                await writer.drain()
+            return
+        if method == 'GET':
+            return await self.respond(writer, 200, job.summary(with_results=True))
+        if method == 'DELETE':
+            self.cancel(job)
+            return await self.respond(writer, 200, job.summary())
+        return await self.respond(writer, 405, {'error': 'method not allowed'})
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, code: int, data) -> None:
+        reasons = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+        body = json.dumps(data).encode()
+        writer.write(f'HTTP/1.1 {code} {reasons[code]}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        stop = asyncio.Event()
+        for signal_number in [signal.SIGINT, signal.SIGTERM]:
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+            except NotImplementedError: # signal handlers of event loops are not available on windows
+                pass
+        print(f"simulation service is listening on http://{host}:{port}")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            for path in self.networks.values():
+                remove_network(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='local UAM network simulation service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of cpus)')
+    parser.add_argument('--cache', default=None, help='result cache file (see result_cache.py), runs with a seed will use it')
+    parser.add_argument('--policy-module', action='append', default=[],
+                        help='module that registers departure policies (see departure_policies.py)')
+    args = parser.parse_args()
+    import_policy_modules(args.policy_module)
+    asyncio.run(SimulationService(args.workers, args.cache).serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
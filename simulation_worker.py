@@ -0,0 +1,98 @@
+"""
+Warm worker processes of the simulation service (simulation_service.py) and distributed sweeps
+(sweep_queue.py). A worker keeps parsed networks and max station time data of the jobs that it has
+run, or reads them from a network published by shared_network.py, and runs one simulation of a job
+at a time:
+
+    init_worker(cache_file, preload)                         # once in every worker process
+    run_job(job, demand_number, seed)                        # KPIs of one run of a job
+
+A job is a dict with vertiport_file_name, mode, cruise_speed, capacity, maximum_wait_time and
+parameters (see JOB_FIELDS in simulation_service.py).
+"""
+import time
+import numpy as np
+from copy import deepcopy
+
+from create_objects import create_vertiport
+from result_cache import ResultCache, file_digest, json_value
+from run_main import DEFAULT_PARAMETERS, create_parameters, create_aircraft_info, load_max_station_time_data, simulate_demand
+from shared_network import attach_network
+
+# warm caches of a worker process (data and digest of its file by file name, see get_network)
+_max_station_time_data = {}
+_networks = {}
+_result_cache = None
+
+
+def init_worker(cache_file: str = None, preload: bool = True) -> None:
+    """
+    This function loads default max station time data once in every worker process (if "preload"
+    is True; workers that read published networks do not need it) and opens the result cache
+    (if it is given).
+    """
+    global _result_cache
+    if preload:
+        get_max_station_time_data(DEFAULT_PARAMETERS['max_station_time_file'])
+    if cache_file:
+        _result_cache = ResultCache(cache_file)
+
+
+def get_max_station_time_data(file_name: str) -> dict:
+    """
+    This function returns max station time data from the worker's cache. The file is loaded again
+    if it is changed.
+    """
+    digest = file_digest(file_name)
+    if _max_station_time_data.get(file_name, (None,))[0] != digest:
+        _max_station_time_data[file_name] = (digest, load_max_station_time_data(file_name))
+    return _max_station_time_data[file_name][1]
+
+
+def get_network(vertiport_file_name: str, cruise_speed: (int, float), capacity: int) -> (list, int):
+    """
+    This function returns a fresh copy of a network from the worker's cache. The network file
+    will be parsed only the first time that it is requested in a worker and again if it is changed,
+    so runs do not use a stale network (and the result cache does not store its KPIs under the key
+    of the changed file).
+    """
+    key = (vertiport_file_name, capacity)
+    digest = file_digest(f"{vertiport_file_name}.xlsx")
+    if _networks.get(key, (None,))[0] != digest:
+        _networks[key] = (digest, create_vertiport(vertiport_file_name, create_aircraft_info(cruise_speed, capacity)))
+    vertiports, last_id = _networks[key][1]
+    return deepcopy(vertiports), last_id
+
+
+def run_job(job: dict, demand_number: int, seed: (int, None), network_path: str = None) -> dict:
+    """
+    This function runs one simulation of a job in a worker process and returns its KPIs. Runs without
+    a seed get fresh random demands (forked workers have the same global random state). If the
+    path of a published network (see shared_network.py) is given, the network and max station
+    time data of the run are read from it.
+    """
+    t_0 = time.time()
+    parameters = create_parameters(job['parameters'])
+    cache_key = None
+    if _result_cache is not None and seed is not None:
+        cache_key = _result_cache.key(job['vertiport_file_name'], job['mode'], job['cruise_speed'], job['capacity'],
+                                      job['maximum_wait_time'], demand_number, seed, parameters)
+        kpis = _result_cache.get(cache_key)
+        if kpis is not None:
+            return {'demand_number': demand_number, 'seed': seed, 'duration': time.time() - t_0, 'cached': True,
+                    'kpis': kpis}
+    if network_path is not None:
+        network = attach_network(network_path)
+        max_station_time_data = network.station_time_grid
+        vertiports, last_id = network.create_vertiports(create_aircraft_info(job['cruise_speed'], job['capacity']))
+    else:
+        max_station_time_data = get_max_station_time_data(parameters['max_station_time_file'])
+        vertiports, last_id = get_network(job['vertiport_file_name'], job['cruise_speed'], job['capacity'])
+    kpis = simulate_demand(job['mode'], job['cruise_speed'], job['capacity'], vertiports, last_id, demand_number,
+                           job['maximum_wait_time'], max_station_time_data, seed=seed, keep_objects=False,
+                           parameters=parameters, rng=np.random.default_rng() if seed is None else None)
+    del kpis['demands'], kpis['vertiports']
+    if cache_key:
+        _result_cache.put(cache_key, kpis)
+    return {'demand_number': demand_number, 'seed': seed, 'duration': time.time() - t_0, 'cached': False,
+            'kpis': {key: json_value(value) for key, value in kpis.items()}}
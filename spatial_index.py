@@ -0,0 +1,80 @@
+import numpy as np
+from math import ceil, sqrt
+
+from objects import Vertiport
+
+
+class VertiportIndex:
+    def __init__(self, vertiports: list, cell_size: float = None):
+        """
+        A uniform grid index over vertiports' positions to find the nearest vertiport that
+        satisfies a condition without checking every vertiport of the network.
+
+        Args:
+            vertiports (list): list of vertiport objects.
+            cell_size (float): size of grid cells in nmi. Default is None (about one vertiport in a cell).
+        """
+        self.vertiports = vertiports
+        self.positions = np.array([vertiport.position for vertiport in vertiports], dtype=float).reshape(-1, 2)
+        if len(vertiports):
+            self.origin = self.positions.min(axis=0)
+            extent = self.positions.max(axis=0) - self.origin
+        else:
+            self.origin = extent = np.zeros(2)
+        if cell_size is None:
+            cell_size = sqrt(max(extent[0], 1) * max(extent[1], 1) / max(len(vertiports), 1))
+        self.cell_size = cell_size
+        self.cells = {}
+        for index, cell in enumerate(self._cell(position) for position in self.positions):
+            self.cells.setdefault(cell, []).append(index)
+        self.max_ring = int(ceil(max(extent) / cell_size)) + 1
+
+    def _cell(self, position) -> tuple:
+        return tuple(int(i) for i in np.floor((np.asarray(position, dtype=float) - self.origin) / self.cell_size))
+
+    def _ring(self, center: tuple, ring: int):
+        """
+        This function yields grid cells with "ring" Chebyshev distance from center cell.
+        """
+        x, y = center
+        if ring == 0:
+            yield center
+            return
+        for i in range(-ring, ring + 1):
+            yield (x + i, y - ring)
+            yield (x + i, y + ring)
+        for j in range(-ring + 1, ring):
+            yield (x - ring, y + j)
+            yield (x + ring, y + j)
+
+    def nearest(self, position: list, condition=None) -> (Vertiport, None):
+        """
+        This function finds the nearest vertiport to position that satisfies condition.
+
+        Args:
+            position (list): a position in this form: [x in nmi, y in nmi].
+            condition (callable): a function that gets a vertiport and returns True for acceptable ones.
+                                  Default is None (every vertiport is acceptable).
+
+        Returns:
+            vertiport (Vertiport): nearest acceptable vertiport (None if there is no acceptable vertiport).
+
+        """
+        center = self._cell(position)
+        # cells outside of the grid are empty, so rings after max_ring (from any center) are skipped
+        last_ring = self.max_ring + max(abs(center[0]), abs(center[1]))
+        best = None
+        for ring in range(last_ring + 1):
+            # every point of a ring's cells is at least (ring - 1) cells far from position
+            if best is not None and (ring - 1) * self.cell_size > best[0]:
+                break
+            candidates = []
+            for cell in self._ring(center, ring):
+                candidates += self.cells.get(cell, [])
+            for index in sorted(candidates):
+                distance = sqrt((self.positions[index][0] - position[0])**2 + (self.positions[index][1] - position[1])**2)
+                if best is not None and (distance, index) >= best:
+                    continue
+                if condition is None or condition(self.vertiports[index]):
+                    best = (distance, index)
+        return None if best is None else self.vertiports[best[1]]
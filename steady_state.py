@@ -0,0 +1,195 @@
+"""
+Warm-up detection and steady-state early stopping. A SteadyStateMonitor samples queue and delay gauges
+of a simulation (see GAUGES) at a fixed interval, finds the warm-up (the empty network at the start)
+by MSER-5 truncation and stops the simulation when the confidence intervals of all gauges' means
+after the warm-up are narrower than a tolerance (relative to the mean, or an absolute tolerance of
+the gauge for gauges that are near zero) in "patience" consecutive samples:
+
+    monitor = SteadyStateMonitor(start_time, tolerance=0.05)
+    vertiports, demands, msg_list, current_epoch = run_simulation(..., steady_state=monitor)
+    monitor.kpis(demands)          # KPIs of demands that started after the warm-up
+
+Finished demands can also be recorded one by one (monitor.record as a demand sink, see
+demand_stream.py), so KPIs of streamed demands are available without keeping them.
+"""
+import math
+import numpy as np
+
+from objects import Demand
+from run_simulation import FINISHED_STATUSES
+from utility import t_quantile_95
+
+GAUGES = ['waiting_passengers', # demands that are started but have not found an aircraft yet
+          'holding_aircrafts', # aircraft that are holding over vertiports
+          'flight_delay'] # mean flight delay of demands that are waiting or are in an aircraft on the ground
+# KPIs of SteadyStateMonitor.kpis
+KPIS = ['warm_up_time', 'stop_epoch', 'steady_demands', 'steady_satisfied_demands', 'steady_mean_flight_delay',
+        'steady_flight_hours_per_hour'] + ['steady_' + gauge for gauge in GAUGES]
+# half widths of confidence intervals that are always stable (below the resolution of the gauges), so
+# gauges with a mean near zero (e.g. no waiting passengers) do not prevent stopping
+ABSOLUTE_TOLERANCES = {'waiting_passengers': 0.5, # passengers
+                       'holding_aircrafts': 0.5, # aircraft
+                       'flight_delay': 30} # seconds (a time step)
+
+
+def mser_truncation(series: list, batch_size: int = 5) -> int:
+    """
+    This function finds the warm-up of a series by MSER (marginal standard error rule) on batch means
+    of "batch_size" observations. Truncation points in the second half of the series are not checked.
+
+    Returns:
+        truncation (int): number of observations at the start of the series that should be removed.
+
+    """
+    number_of_batches = len(series) // batch_size
+    if number_of_batches < 2:
+        return 0
+    means = np.asarray(series[:number_of_batches * batch_size], dtype=float).reshape(number_of_batches, batch_size).mean(axis=1)
+    # sums of batch means (and their squares) from every batch to the end
+    sums = np.cumsum(means[::-1])[::-1]
+    square_sums = np.cumsum((means ** 2)[::-1])[::-1]
+    truncations = np.arange(number_of_batches // 2 + 1)
+    remaining = number_of_batches - truncations
+    squared_errors = square_sums[truncations] - sums[truncations] ** 2 / remaining
+    mser = np.maximum(squared_errors, 0) / remaining ** 2
+    return int(np.argmin(mser)) * batch_size
+
+
+class SteadyStateMonitor:
+    def __init__(self, start_epoch: int, interval: int = 300, tolerance: float = 0.05, patience: int = 3,
+                 min_time: int = 7200, early_stop: bool = True, batch_size: int = 5, min_batches: int = 10,
+                 horizon: int = 3600, absolute_tolerances: dict = None):
+        """
+        Args:
+            start_epoch (int): start time of simulation.
+            interval (int): time between two samples of gauges in seconds.
+            tolerance (float): maximum half width of 95% confidence interval of a gauge's mean relative
+                               to the mean.
+            patience (int): number of consecutive stable samples before stopping the simulation.
+            min_time (int): minimum simulated time before stopping in seconds.
+            early_stop (bool): stop the simulation in steady state or only detect the warm-up.
+            batch_size (int): number of samples in a batch (5 for MSER-5).
+            min_batches (int): minimum number of batches after the warm-up to check steady state.
+            horizon (int): demands that started in the last "horizon" seconds of the simulation are not
+                           used in KPIs (most of them are not finished).
+            absolute_tolerances (dict): maximum half width of 95% confidence interval of every gauge's
+                                        mean that is always stable. Default is None (ABSOLUTE_TOLERANCES).
+        """
+        self.start_epoch = start_epoch
+        self.interval = interval
+        self.tolerance = tolerance
+        self.patience = patience
+        self.min_time = min_time
+        self.early_stop = early_stop
+        self.batch_size = batch_size
+        self.min_batches = min_batches
+        self.horizon = horizon
+        self.absolute_tolerances = {**ABSOLUTE_TOLERANCES, **(absolute_tolerances or {})}
+        self.samples = {gauge: [] for gauge in GAUGES}
+        self.flight_hours = [] # total flight hours of the fleet at every sample
+        self.last_epoch = start_epoch
+        self.stable_samples = 0
+        self.stop_epoch = None
+        # demands by sample index of their start time: [demands, finished, satisfied, total flight delay of satisfied]
+        self.buckets = {}
+
+    def update(self, current_epoch: int, vertiports: list, demands: list) -> bool:
+        """
+        This function samples the gauges (if it is the time of a sample) and returns True if the
+        simulation should stop.
+        """
+        self.last_epoch = current_epoch
+        if current_epoch < self.start_epoch + len(self.flight_hours) * self.interval:
+            return False
+        waiting_passengers = 0
+        flight_delays = []
+        for demand in demands:
+            status = demand.status.lower()
+            if status == 'scheduled' and current_epoch > demand.start_time:
+                waiting_passengers += 1
+                flight_delays.append(demand.delayed_at['flight_delay'])
+            elif status == 'in aircraft':
+                flight_delays.append(demand.delayed_at['flight_delay'])
+        self.samples['waiting_passengers'].append(waiting_passengers)
+        self.samples['holding_aircrafts'].append(sum(len(vertiport.holding_aircrafts) for vertiport in vertiports))
+        self.samples['flight_delay'].append(np.mean(flight_delays) if flight_delays else 0)
+        self.flight_hours.append(sum(aircraft.flight_hours for vertiport in vertiports for aircraft in vertiport.aircrafts))
+        if not self.early_stop or current_epoch - self.start_epoch < self.min_time:
+            return False
+        self.stable_samples = self.stable_samples + 1 if self.is_stable() else 0
+        if self.stable_samples >= self.patience:
+            self.stop_epoch = current_epoch
+            return True
+        return False
+
+    def warm_up_samples(self) -> int:
+        """
+        This function returns the number of warm-up samples (the largest MSER truncation of gauges).
+        """
+        return max(mser_truncation(self.samples[gauge], self.batch_size) for gauge in GAUGES)
+
+    def is_stable(self) -> bool:
+        """
+        This function checks that the confidence intervals of all gauges' means after the warm-up
+        are narrower than the tolerance (or the absolute tolerance of the gauge).
+        """
+        warm_up = self.warm_up_samples()
+        number_of_batches = (len(self.flight_hours) - warm_up) // self.batch_size
+        if number_of_batches < self.min_batches:
+            return False
+        t_value = t_quantile_95(number_of_batches - 1)
+        for gauge in GAUGES:
+            series = np.asarray(self.samples[gauge][warm_up:warm_up + number_of_batches * self.batch_size], dtype=float)
+            means = series.reshape(number_of_batches, self.batch_size).mean(axis=1)
+            half_width = t_value * means.std(ddof=1) / math.sqrt(number_of_batches)
+            if half_width > max(self.tolerance * abs(means.mean()), self.absolute_tolerances[gauge]):
+                return False
+        return True
+
+    def record(self, demand: Demand) -> None:
+        """
+        This function records a demand (it should be called once for every demand).
+        """
+        bucket = self.buckets.setdefault((demand.start_time - self.start_epoch) // self.interval, [0, 0, 0, 0])
+        status = demand.status.lower()
+        bucket[0] += 1
+        if status in FINISHED_STATUSES:
+            bucket[1] += 1
+        if status == 'satisfied':
+            bucket[2] += 1
+            bucket[3] += demand.delayed_at['flight_delay']
+
+    def kpis(self, demands: list = None) -> dict:
+        """
+        This function calculates KPIs of steady state (after the warm-up).
+
+        Args:
+            demands (list): demands of the simulation that have not been recorded. Default is None.
+
+        Returns:
+            kpis (dict): warm_up_time (seconds), stop_epoch (None if the simulation was not stopped),
+                steady_demands (demands that started after the warm-up and before the horizon),
+                steady_satisfied_demands (percent), steady_mean_flight_delay (hours),
+                steady_flight_hours_per_hour (flight hours of the fleet in an hour) and the mean of
+                every gauge (steady_<gauge>).
+
+        """
+        for demand in demands or []:
+            self.record(demand)
+        warm_up = self.warm_up_samples() if self.flight_hours else 0
+        last_bucket = (self.last_epoch - self.horizon - self.start_epoch) // self.interval
+        steady = np.zeros(4)
+        for index, bucket in self.buckets.items():
+            if warm_up <= index < last_bucket:
+                steady += bucket
+        kpis = {'warm_up_time': warm_up * self.interval, 'stop_epoch': self.stop_epoch, 'steady_demands': int(steady[0]),
+                'steady_satisfied_demands': steady[2] / steady[0] * 100 if steady[0] else float('nan'),
+                'steady_mean_flight_delay': steady[3] / steady[2] / 3600 if steady[2] else float('nan')}
+        if len(self.flight_hours) - warm_up > 1:
+            kpis['steady_flight_hours_per_hour'] = (self.flight_hours[-1] - self.flight_hours[warm_up]) / \
+                ((len(self.flight_hours) - 1 - warm_up) * self.interval / 3600)
+        else:
+            kpis['steady_flight_hours_per_hour'] = float('nan')
+        for gauge in GAUGES:
+            kpis['steady_' + gauge] = float(np.mean(self.samples[gauge][warm_up:])) if self.samples[gauge][warm_up:] else float('nan')
+        return kpis
@@ -0,0 +1,80 @@
+"""
+Checks of steady-state early stopping (steady_state.py) on the example scenario at the documented
+tolerance of 0.05 (scenario_example.toml):
+
+    python steady_state_check.py [scenario] [--tolerance 0.05] [--seed 1]
+
+    stop    simulations of all demand numbers of the scenario are stopped before the end of
+            their window (gauges near zero do not prevent stopping).
+    kpis    KPIs of the whole window of stopped simulations are None and their steady state KPIs
+            are available.
+"""
+import argparse
+import math
+import sys
+
+from cli import create_scenario, load_scenario
+from create_objects import create_vertiport
+from demand_stream import DAY
+from run_main import create_aircraft_info, load_max_station_time_data, simulate_demand
+from steady_state import GAUGES
+
+# KPIs of the whole window (see calc_kpis) that are checked in stopped simulations
+WINDOW_KPIS = ['satisfied_demands', 'mean_flight_delay']
+STEADY_KPIS = ['steady_satisfied_demands', 'steady_mean_flight_delay'] + ['steady_' + gauge for gauge in GAUGES]
+
+
+def check_scenario(scenario: dict, tolerance: float, seed: int) -> list:
+    """
+    This function runs every demand number of a scenario with steady-state early stopping.
+
+    Returns:
+        failures (list): (check, message) of failed checks.
+
+    """
+    parameters = {**scenario['parameters'], 'steady_state_tolerance': tolerance}
+    end_epoch = parameters['end_time'] + (parameters['days'] - 1) * DAY + parameters['end_margin']
+    max_station_time_data = load_max_station_time_data(parameters['max_station_time_file'])
+    failures = []
+    for demand_number in range(scenario['start_demand'], scenario['end_demand'] + 1, scenario['demand_step']):
+        vertiports, last_id = create_vertiport(scenario['vertiport_file_name'],
+                                               create_aircraft_info(scenario['cruise_speed'], scenario['capacity'],
+                                                                    parameters))
+        out_data = simulate_demand(scenario['mode'], scenario['cruise_speed'], scenario['capacity'], vertiports,
+                                   last_id, demand_number, scenario['maximum_wait_time'], max_station_time_data,
+                                   seed=seed, keep_objects=False, parameters=parameters)
+        stop_epoch = out_data['stop_epoch']
+        if stop_epoch is None or stop_epoch >= end_epoch:
+            failures.append(('stop', f"{demand_number} demands: not stopped"))
+            continue
+        print(f"    {demand_number} demands: warm-up {out_data['warm_up_time'] / 3600:.2f} hours, stopped after "
+              f"{(stop_epoch - parameters['start_time']) / 3600:.2f} of "
+              f"{(end_epoch - parameters['start_time']) / 3600:.2f} hours, steady satisfied demands "
+              f"{out_data['steady_satisfied_demands']:.1f}%, steady mean flight delay "
+              f"{out_data['steady_mean_flight_delay'] * 60:.1f} minutes")
+        window = [kpi for kpi in WINDOW_KPIS if out_data[kpi] is not None]
+        if window:
+            failures.append(('kpis', f"{demand_number} demands: KPIs of the whole window {window} are not None"))
+        missing = [kpi for kpi in STEADY_KPIS if out_data[kpi] is None or math.isnan(out_data[kpi])]
+        if missing:
+            failures.append(('kpis', f"{demand_number} demands: steady state KPIs {missing} are not available"))
+    return failures
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='check steady-state early stopping on a scenario')
+    parser.add_argument('scenario', nargs='?', default='scenario_example.toml', help='scenario file')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='steady_state_tolerance of the runs')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the runs')
+    args = parser.parse_args(argv)
+    failures = check_scenario(create_scenario(load_scenario(args.scenario)), args.tolerance, args.seed)
+    for check in ['stop', 'kpis']:
+        messages = [message for name, message in failures if name == check]
+        print(f"{'FAIL' if messages else 'PASS'} {check}")
+        for message in messages:
+            print(f"    {message}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
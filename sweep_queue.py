@@ -0,0 +1,333 @@
+"""
+Distributed sweeps over a shared job queue. A coordinator expands a grid of scenarios (network files,
+modes, cruise speeds, capacities, max wait times, demand numbers and seeds) into job records of a
+sqlite file, and workers on any number of machines that can reach the file claim jobs, run them and
+write their KPIs:
+
+    python sweep_queue.py init sweep.sqlite grid.toml      # run again to add new points of the grid
+    python sweep_queue.py worker sweep.sqlite --processes 4
+    python sweep_queue.py status sweep.sqlite
+    python sweep_queue.py export sweep.sqlite results.csv
+
+A grid file (json, toml or yaml) has the fields of GRID_FIELDS; vertiport_file_name, mode, cruise_speed,
+capacity and maximum_wait_time can be a value or a list of values. Every job is identified by the hash
+of its inputs (parameters that are not given by the grid are not a part of it, so new default parameters
+do not change it), so expanding a grid again does not add existing jobs and a result is written once.
+A claimed job is leased to its worker for "lease_time" seconds and the worker renews the lease while
+the job runs; jobs of dead workers are claimed again when their leases expire (a job fails after
+"max_attempts" claims).
+The queue file should be on a file system with working file locks (e.g. a local disk or NFS v4).
+Leases, reclaim and max attempts are checked with several worker processes by sweep_queue_check.py .
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+from cli import REQUIRED, fill_fields, load_scenario
+from departure_policies import import_policy_modules, resolve_departure_policy
+from run_main import create_parameters
+from simulation_worker import init_worker, run_job
+
+# grid fields and their default values
+GRID_FIELDS = {'vertiport_file_name': REQUIRED, 'mode': REQUIRED, 'cruise_speed': REQUIRED, 'capacity': REQUIRED,
+               'maximum_wait_time': REQUIRED, 'start_demand': REQUIRED, 'end_demand': REQUIRED, 'demand_step': 1,
+               'seeds': [None], 'parameters': {}}
+# grid fields that can have a list of values
+SWEPT_FIELDS = ['vertiport_file_name', 'mode', 'cruise_speed', 'capacity', 'maximum_wait_time']
+JOB_STATUSES = ['queued', 'running', 'done', 'failed']
+
+
+def expand_grid(data: dict) -> list:
+    """
+    This function expands a grid into job specs (one for each combination of swept fields,
+    demand number and seed).
+
+    Raises:
+        ValueError: if a required field is missing or there is an unknown field or a value is not valid.
+
+    """
+    grid = fill_fields(data, GRID_FIELDS, 'grid')
+    if grid['demand_step'] <= 0:
+        raise ValueError("demand_step must be positive")
+    # modes are names of registered departure policies (see departure_policies.py)
+    for mode in grid['mode'] if isinstance(grid['mode'], list) else [grid['mode']]:
+        resolve_departure_policy(mode)
+    # only given parameters are stored, so keys of jobs do not change when new parameters get defaults
+    create_parameters(grid['parameters'])
+    parameters = dict(grid['parameters'])
+    swept_values = [grid[field] if isinstance(grid[field], list) else [grid[field]] for field in SWEPT_FIELDS]
+    specs = []
+    for values in itertools.product(*swept_values):
+        for demand_number in range(grid['start_demand'], grid['end_demand'] + 1, grid['demand_step']):
+            for seed in grid['seeds']:
+                specs.append({**dict(zip(SWEPT_FIELDS, values)), 'demand_number': demand_number, 'seed': seed,
+                              'parameters': parameters})
+    return specs
+
+
+def job_key(spec: dict) -> str:
+    """
+    This function creates the key of a job from its spec (parameters of a spec are only the parameters
+    that the grid gives).
+    """
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class SweepQueue:
+    def __init__(self, file_name: str, lease_time: float = 300, max_attempts: int = 3):
+        """
+        Args:
+            file_name (str): sqlite file of the queue.
+            lease_time (float): time that a claimed job belongs to a worker without a heartbeat in seconds.
+            max_attempts (int): maximum number of claims of a job.
+        """
+        self.file_name = file_name
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(file_name, timeout=60, isolation_level=None)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, spec TEXT, status TEXT, '
+                                'worker TEXT, lease_expires REAL, attempts INTEGER, error TEXT, created REAL, '
+                                'started REAL, finished REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, kpis TEXT, worker TEXT, '
+                                'duration REAL, cached INTEGER, finished REAL)')
+
+    def _transaction(self, function, *args):
+        """
+        This function runs function(*args) in a write transaction (only one worker at a time).
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            out = function(*args)
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        return out
+
+    def add_jobs(self, specs: list) -> int:
+        """
+        This function adds jobs that are not in the queue and returns the number of added jobs.
+        """
+        def add():
+            now = time.time()
+            added = 0
+            for spec in specs:
+                added += self.connection.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, 'queued', NULL, NULL, 0, NULL, ?, NULL, NULL)",
+                                                 (job_key(spec), json.dumps(spec, sort_keys=True), now)).rowcount
+            return added
+        return self._transaction(add)
+
+    def claim(self, worker: str) -> (tuple, None):
+        """
+        This function leases a queued job (or a job with an expired lease) to worker.
+
+        Returns:
+            job (tuple): (key, spec) of the claimed job (None if there is no job to claim).
+
+        """
+        def claim():
+            now = time.time()
+            # jobs of dead workers that can not be claimed again
+            self.connection.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', lease_expires = NULL "
+                                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = self.connection.execute("SELECT key, spec FROM jobs WHERE status = 'queued' ORDER BY rowid LIMIT 1").fetchone()
+            if row is None:
+                row = self.connection.execute("SELECT key, spec FROM jobs WHERE status = 'running' AND lease_expires < ? "
+                                              "ORDER BY lease_expires LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                                    "started = ? WHERE key = ?", (worker, now + self.lease_time, now, row[0]))
+            return row[0], json.loads(row[1])
+        return self._transaction(claim)
+
+    def heartbeat(self, key: str, worker: str) -> bool:
+        """
+        This function renews the lease of a job and returns False if the job does not belong to worker anymore.
+        """
+        return bool(self.connection.execute("UPDATE jobs SET lease_expires = ? WHERE key = ? AND worker = ? AND status = 'running'",
+                                            (time.time() + self.lease_time, key, worker)).rowcount)
+
+    def complete(self, key: str, worker: str, result: dict) -> None:
+        """
+        This function stores the result of a job (only the first result of a job is stored).
+        """
+        def complete():
+            self.connection.execute('INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                                    (key, json.dumps(result['kpis']), worker, result['duration'], result['cached'], time.time()))
+            self.connection.execute("UPDATE jobs SET status = 'done', lease_expires = NULL, error = NULL, finished = ? WHERE key = ?",
+                                    (time.time(), key))
+        self._transaction(complete)
+
+    def fail(self, key: str, worker: str, error: str) -> None:
+        """
+        This function returns a failed job to the queue (or marks it failed after max_attempts claims).
+        """
+        self.connection.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                                "worker = NULL, lease_expires = NULL, error = ? WHERE key = ? AND worker = ? AND status = 'running'",
+                                (self.max_attempts, error, key, worker))
+
+    def status(self) -> dict:
+        """
+        This function returns number of jobs of every status, running jobs of every worker and
+        number of expired leases.
+        """
+        counts = dict(self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        workers = dict(self.connection.execute("SELECT worker, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY worker").fetchall())
+        expired = self.connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_expires < ?",
+                                          (time.time(),)).fetchone()[0]
+        return {'jobs': {status: counts.get(status, 0) for status in JOB_STATUSES}, 'workers': workers,
+                'expired_leases': expired}
+
+    def results(self):
+        """
+        This generator yields (spec, result) of finished jobs.
+        """
+        for spec, kpis, worker, duration, cached in self.connection.execute(
+                'SELECT jobs.spec, results.kpis, results.worker, results.duration, results.cached FROM results '
+                'JOIN jobs ON jobs.key = results.key ORDER BY jobs.rowid'):
+            yield json.loads(spec), {'kpis': json.loads(kpis), 'worker': worker, 'duration': duration, 'cached': bool(cached)}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def _heartbeat(file_name: str, lease_time: float, key: str, worker: str, stop: threading.Event) -> None:
+    queue = SweepQueue(file_name, lease_time)
+    while not stop.wait(lease_time / 3):
+        if not queue.heartbeat(key, worker):
+            break
+    queue.close()
+
+
+def run_worker(file_name: str, worker: str = None, lease_time: float = 300, max_attempts: int = 3,
+               cache_file: str = None, wait: bool = False, poll_interval: float = 5, max_jobs: int = None) -> int:
+    """
+    This function claims and runs jobs of a queue until there is no job to claim.
+
+    Args:
+        file_name (str): sqlite file of the queue.
+        worker (str): name of the worker. Default is None (host name and process id).
+        lease_time (float): see SweepQueue.
+        max_attempts (int): see SweepQueue.
+        cache_file (str): result cache file (see result_cache.py). Default is None.
+        wait (bool): wait for new jobs (and expired leases) when there is no job to claim. Default is False.
+        poll_interval (float): time between two claims when there is no job in seconds.
+        max_jobs (int): maximum number of jobs to run. Default is None (no limit).
+
+    Returns:
+        number_of_jobs (int): number of jobs that the worker has run.
+
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = SweepQueue(file_name, lease_time, max_attempts)
+    init_worker(cache_file)
+    number_of_jobs = 0
+    while max_jobs is None or number_of_jobs < max_jobs:
+        job = queue.claim(worker)
+        if job is None:
+            if not wait:
+                break
+            time.sleep(poll_interval)
+            continue
+        key, spec = job
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(file_name, lease_time, key, worker, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_job(spec, spec['demand_number'], spec['seed'])
+        except Exception as error:
+            queue.fail(key, worker, repr(error))
+        else:
+            queue.complete(key, worker, result)
+        finally:
+            stop.set()
+            heartbeat.join()
+        number_of_jobs += 1
+    queue.close()
+    return number_of_jobs
+
+
+def export_results(file_name: str, out_file_name: str) -> int:
+    """
+    This function writes inputs and KPIs of finished jobs to a csv file and returns number of rows.
+    Columns are the fields of all rows (jobs with different parameters can have different KPIs).
+    """
+    queue = SweepQueue(file_name)
+    rows = [{**{field: spec[field] for field in SWEPT_FIELDS + ['demand_number', 'seed']},
+             'parameters': json.dumps(spec['parameters'], sort_keys=True), **result['kpis'],
+             'worker': result['worker'], 'duration': result['duration'], 'cached': result['cached']}
+            for spec, result in queue.results()]
+    queue.close()
+    fieldnames = list(dict.fromkeys(field for row in rows for field in row))
+    with open(out_file_name, 'w', newline='') as file:
+        if rows:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    return len(rows)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='distributed sweeps of simulations over a shared sqlite job queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init = commands.add_parser('init', help='expand a grid file into jobs of the queue')
+    init.add_argument('queue')
+    init.add_argument('grid', help='grid file (.json, .toml, .yaml or .yml)')
+    worker = commands.add_parser('worker', help='run jobs of the queue')
+    worker.add_argument('queue')
+    worker.add_argument('--processes', type=int, default=1, help='number of worker processes on this machine')
+    worker.add_argument('--lease', type=float, default=300, help='lease time of a claimed job in seconds')
+    worker.add_argument('--max-attempts', type=int, default=3)
+    worker.add_argument('--cache', help='result cache file (see result_cache.py)')
+    worker.add_argument('--wait', action='store_true', help='wait for new jobs instead of exiting when the queue is empty')
+    status = commands.add_parser('status', help='print number of jobs of every status')
+    status.add_argument('queue')
+    export = commands.add_parser('export', help='write results to a csv file')
+    export.add_argument('queue')
+    export.add_argument('out_file')
+    for command in [init, worker]:
+        command.add_argument('--policy-module', action='append', default=[],
+                             help='module that registers departure policies (see departure_policies.py)')
+    args = parser.parse_args(argv)
+    if args.command in ['init', 'worker']:
+        import_policy_modules(args.policy_module)
+    if args.command == 'init':
+        try:
+            specs = expand_grid(load_scenario(args.grid))
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        queue = SweepQueue(args.queue)
+        print(f"{queue.add_jobs(specs)} new jobs of {len(specs)} jobs of the grid")
+        queue.close()
+    elif args.command == 'worker':
+        worker_args = (args.queue, None, args.lease, args.max_attempts, args.cache, args.wait)
+        if args.processes == 1:
+            print(f"{run_worker(*worker_args)} jobs are done")
+        else:
+            processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+    elif args.command == 'status':
+        queue = SweepQueue(args.queue)
+        print(json.dumps(queue.status(), indent=4))
+        queue.close()
+    elif args.command == 'export':
+        print(f"{export_results(args.queue, args.out_file)} results are written to {args.out_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Checks of sweep_queue.py with several worker processes on one machine. Workers share a queue file
+with a short lease time and a "killed worker" is a process that claims a job and is killed (SIGKILL)
+before it finishes it:
+
+    python sweep_queue_check.py
+
+    reclaim        jobs of a killed worker are claimed again by other workers when their leases
+                   expire, and every job has exactly one result (the same as running it directly).
+    heartbeat      jobs that run longer than the lease time are not claimed by other workers.
+    lease_attempts a job that is claimed max_attempts times by killed workers fails ('lease expired').
+    error_attempts a job that raises an error is run max_attempts times and then fails.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from sweep_queue import SweepQueue, expand_grid, run_worker
+from simulation_worker import run_job
+
+# jobs of the checks (every job runs longer than LEASE_TIME)
+GRID = {'vertiport_file_name': 'vertiport_info_144_12', 'mode': 'wait', 'cruise_speed': 120, 'capacity': 12,
+        'maximum_wait_time': 1200, 'start_demand': 600, 'end_demand': 1000, 'demand_step': 200, 'seeds': [1, 2]}
+LEASE_TIME = 0.5 # seconds
+
+
+def _claim_and_hang(file_name: str, keys: multiprocessing.Queue) -> None:
+    queue = SweepQueue(file_name, LEASE_TIME)
+    job = queue.claim('killed')
+    keys.put(None if job is None else job[0])
+    time.sleep(3600)
+
+
+def kill_worker(file_name: str) -> (str, None):
+    """
+    This function starts a process that claims a job, kills it and returns the key of its job.
+    """
+    keys = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_claim_and_hang, args=(file_name, keys))
+    process.start()
+    key = keys.get(timeout=60)
+    process.kill()
+    process.join()
+    return key
+
+
+def start_workers(file_name: str, processes: int, max_attempts: int = 3, wait: bool = True) -> list:
+    workers = [multiprocessing.Process(target=run_worker, args=(file_name, f'worker_{i}', LEASE_TIME, max_attempts),
+                                       kwargs={'wait': wait, 'poll_interval': 0.1})
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def wait_for_queue(queue: SweepQueue, timeout: float = 600) -> None:
+    """
+    This function waits until no job of a queue is queued or running.
+    """
+    t_0 = time.time()
+    while time.time() - t_0 < timeout:
+        jobs = queue.status()['jobs']
+        if not jobs['queued'] and not jobs['running']:
+            return
+        time.sleep(0.2)
+    raise TimeoutError("jobs of the queue are not finished")
+
+
+def jobs_table(queue: SweepQueue) -> dict:
+    """
+    This function returns {key: (status, worker, attempts, error)} of all jobs of a queue.
+    """
+    return {key: row for key, *row in queue.connection.execute('SELECT key, status, worker, attempts, error FROM jobs')}
+
+
+def check_reclaim(directory: str) -> list:
+    """
+    This function checks reclaim and heartbeat with a killed worker and three worker processes.
+
+    Returns:
+        failures (list): (check, message) of failed checks.
+
+    """
+    file_name = os.path.join(directory, 'reclaim.sqlite')
+    queue = SweepQueue(file_name, LEASE_TIME)
+    specs = expand_grid(GRID)
+    queue.add_jobs(specs)
+    killed_key = kill_worker(file_name)
+    workers = start_workers(file_name, 3)
+    try:
+        wait_for_queue(queue)
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+    failures = []
+    jobs = jobs_table(queue)
+    results = list(queue.results())
+    if any(status != 'done' for status, worker, attempts, error in jobs.values()):
+        failures.append(('reclaim', f"jobs are not done: {jobs}"))
+    if len(results) != len(specs):
+        failures.append(('reclaim', f"{len(results)} results of {len(specs)} jobs"))
+    status, worker, attempts, error = jobs[killed_key]
+    if attempts != 2 or worker == 'killed':
+        failures.append(('reclaim', f"job of the killed worker: attempts {attempts}, worker {worker}"))
+    spec, result = results[0]
+    if run_job(spec, spec['demand_number'], spec['seed'])['kpis'] != result['kpis']:
+        failures.append(('reclaim', "a result is not the same as running its job directly"))
+    long_jobs = [result for spec, result in results if result['duration'] > LEASE_TIME]
+    reclaimed = [key for key, (status, worker, attempts, error) in jobs.items() if key != killed_key and attempts != 1]
+    if not long_jobs:
+        failures.append(('heartbeat', f"no job runs longer than the lease time ({LEASE_TIME} seconds)"))
+    if reclaimed:
+        failures.append(('heartbeat', f"{len(reclaimed)} jobs of live workers are claimed again"))
+    queue.close()
+    return failures
+
+
+def check_attempts(directory: str) -> list:
+    """
+    This function checks max_attempts of jobs of killed workers and of jobs that raise an error.
+
+    Returns:
+        failures (list): (check, message) of failed checks.
+
+    """
+    failures = []
+    file_name = os.path.join(directory, 'lease_attempts.sqlite')
+    queue = SweepQueue(file_name, LEASE_TIME, max_attempts=2)
+    queue.add_jobs(expand_grid({**GRID, 'end_demand': GRID['start_demand'], 'seeds': [1]}))
+    kill_worker(file_name)
+    time.sleep(LEASE_TIME * 2)
+    kill_worker(file_name)
+    time.sleep(LEASE_TIME * 2)
+    workers = start_workers(file_name, 2, max_attempts=2, wait=False)
+    for worker in workers:
+        worker.join()
+    [(status, worker, attempts, error)] = jobs_table(queue).values()
+    if (status, attempts, error) != ('failed', 2, 'lease expired'):
+        failures.append(('lease_attempts', f"job: status {status}, attempts {attempts}, error {error}"))
+    queue.close()
+    file_name = os.path.join(directory, 'error_attempts.sqlite')
+    queue = SweepQueue(file_name, LEASE_TIME, max_attempts=2)
+    queue.add_jobs(expand_grid({**GRID, 'vertiport_file_name': 'missing_network', 'end_demand': GRID['start_demand'],
+                                'seeds': [1]}))
+    workers = start_workers(file_name, 2, max_attempts=2, wait=False)
+    for worker in workers:
+        worker.join()
+    [(status, worker, attempts, error)] = jobs_table(queue).values()
+    if status != 'failed' or attempts != 2 or 'FileNotFoundError' not in (error or ''):
+        failures.append(('error_attempts', f"job: status {status}, attempts {attempts}, error {error}"))
+    queue.close()
+    return failures
+
+
+def main(argv: list = None) -> int:
+    argparse.ArgumentParser(description='check leases, reclaim and max attempts of sweep_queue.py with '
+                                        'several worker processes').parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        failures = check_reclaim(directory) + check_attempts(directory)
+    for check in ['reclaim', 'heartbeat', 'lease_attempts', 'error_attempts']:
+        messages = [message for name, message in failures if name == check]
+        print(f"{'FAIL' if messages else 'PASS'} {check}")
+        for message in messages:
+            print(f"    {message}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
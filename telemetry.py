@@ -0,0 +1,176 @@
+"""
+Per-tick telemetry of vertiports. A TelemetryRecorder samples gauges of every vertiport at a
+configurable interval into a preallocated array that is backed by a .npy file (np.memmap), so
+long simulations do not grow the memory and results can be opened without copying:
+
+    telemetry = TelemetryRecorder('telemetry/run_1', vertiports, start_time, end_time, interval=300)
+    run_simulation(..., telemetry=telemetry)
+    data, meta = load_telemetry('telemetry/run_1')
+    hourly_holding = downsample(gauge_series(data, meta, 'holding_aircrafts'), 12, 'max')
+
+Samples are stored in an array with (sample, vertiport, gauge) shape.
+"""
+import json
+import os
+import numpy as np
+
+from objects import Vertiport
+
+# aircraft are counted in the vertiport that holds them in the simulation (airborne aircraft
+# stay in their origin vertiport until they land).
+PHASES = ['ready', 'occupied', 'takeoff', 'climb', 'cruise', 'holding', 'landing', 'turnaround']
+GAUGES = ['waiting_passengers', # demands that are started but have not found an aircraft yet
+          'departure_queue', # aircraft that should leave the vertiport but there is no empty pad
+          'holding_aircrafts', # aircraft that are holding over the vertiport
+          'occupied_stands', # occupied capacity of the vertiport
+          'pad_utilization', # ratio of pads that are not ready
+          'aircraft_arrive_rate', # aircraft arrive rate in the last hour
+          'max_station_time'] + ['aircraft_' + phase for phase in PHASES]
+
+
+class TelemetryRecorder:
+    def __init__(self, path: str, vertiports: list, start_epoch: int, end_epoch: int, interval: int = 300):
+        """
+        Args:
+            path (str): path of telemetry files without extension (path.npy and path.json will be created).
+            vertiports (list): list of vertiport objects of the simulation.
+            start_epoch (int): start time of simulation.
+            end_epoch (int): end time of simulation.
+            interval (int): time between two samples in seconds.
+        """
+        if interval <= 0:
+            raise ValueError("telemetry interval must be positive")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.start_epoch = start_epoch
+        self.interval = interval
+        self.vertiport_ids = [vertiport.id_ for vertiport in vertiports]
+        self.vertiport_names = [vertiport.name for vertiport in vertiports]
+        self.columns = {id_: i for i, id_ in enumerate(self.vertiport_ids)}
+        self.gauge_columns = {gauge: i for i, gauge in enumerate(GAUGES)}
+        number_of_samples = int((end_epoch - start_epoch) // interval) + 1
+        self.data = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=np.float32,
+                                              shape=(number_of_samples, len(vertiports), len(GAUGES)))
+        self.recorded_samples = 0
+        self.last_sample = -1
+
+    def is_sampling(self, current_epoch: int) -> bool:
+        """
+        This function determines that a sample should be recorded in current epoch or not.
+        """
+        sample = (current_epoch - self.start_epoch) // self.interval
+        return sample > self.last_sample and sample < len(self.data)
+
+    def record(self, current_epoch: int, vertiports: list, demands: list, tick_gauges: dict) -> None:
+        """
+        This function records gauges of all vertiports at the end of a tick.
+
+        Args:
+            tick_gauges (dict): gauges that are calculated in the tick in this form:
+                {vertiport id_: {gauge: value}}
+
+        """
+        if not self.is_sampling(current_epoch):
+            return
+        sample = int((current_epoch - self.start_epoch) // self.interval)
+        row = self.data[sample]
+        row[:] = 0
+        waiting_column = self.gauge_columns['waiting_passengers']
+        for demand in demands:
+            if demand.status.lower() == 'scheduled' and current_epoch > demand.start_time:
+                row[self.columns[demand.origin_id], waiting_column] += 1
+        for vertiport in vertiports:
+            self._record_vertiport(row[self.columns[vertiport.id_]], vertiport, tick_gauges.get(vertiport.id_, {}))
+        # samples that are skipped (for example when interval is smaller than time step) repeat the last one
+        if self.last_sample >= 0:
+            self.data[self.last_sample + 1:sample] = self.data[self.last_sample]
+        self.last_sample = sample
+        self.recorded_samples = sample + 1
+
+    def _record_vertiport(self, row: np.ndarray, vertiport: Vertiport, gauges: dict) -> None:
+        for gauge, value in gauges.items():
+            row[self.gauge_columns[gauge]] = value
+        row[self.gauge_columns['holding_aircrafts']] = len(vertiport.holding_aircrafts)
+        if vertiport.pads:
+            busy_pads = len([pad for pad in vertiport.pads if pad.status.lower() != 'ready'])
+            row[self.gauge_columns['pad_utilization']] = busy_pads / len(vertiport.pads)
+        for aircraft in vertiport.aircrafts:
+            status = aircraft.status.lower()
+            if status in ['ready', 'occupied', 'turnaround', 'landing']:
+                row[self.gauge_columns['occupied_stands']] += 1
+            if status in PHASES:
+                row[self.gauge_columns['aircraft_' + status]] += 1
+
+    def flush(self) -> None:
+        """
+        This function writes recorded samples and their description (path.json) to the disk.
+        """
+        self.data.flush()
+        meta = {'gauges': GAUGES, 'vertiport_ids': self.vertiport_ids, 'vertiport_names': self.vertiport_names,
+                'start_epoch': self.start_epoch, 'interval': self.interval, 'recorded_samples': self.recorded_samples}
+        with open(self.path + '.json', 'w') as file:
+            json.dump(meta, file)
+
+
+def load_telemetry(path: str) -> (np.ndarray, dict):
+    """
+    This function opens telemetry files (without copying them to memory).
+
+    Args:
+        path (str): path of telemetry files without extension.
+
+    Returns:
+        data (np.ndarray): read only array of recorded samples with (sample, vertiport, gauge) shape.
+        meta (dict): description of data (gauges, vertiport_ids, vertiport_names, start_epoch,
+                     interval and recorded_samples).
+
+    """
+    with open(path + '.json') as file:
+        meta = json.load(file)
+    data = np.load(path + '.npy', mmap_mode='r')
+    return data[:meta['recorded_samples']], meta
+
+
+def gauge_series(data: np.ndarray, meta: dict, gauge: str, vertiport_id: int = None) -> np.ndarray:
+    """
+    This function selects time series of a gauge for all vertiports (sample, vertiport) or
+    for a vertiport (sample,).
+    """
+    series = data[:, :, meta['gauges'].index(gauge)]
+    if vertiport_id is None:
+        return series
+    return series[:, meta['vertiport_ids'].index(vertiport_id)]
+
+
+def sample_epochs(meta: dict) -> np.ndarray:
+    """
+    This function returns epoch of every recorded sample.
+    """
+    return meta['start_epoch'] + meta['interval'] * np.arange(meta['recorded_samples'])
+
+
+def downsample(series: np.ndarray, factor: int, how: str = 'mean') -> np.ndarray:
+    """
+    This function downsamples a time series (first axis is time) by aggregating every "factor"
+    samples. The last incomplete group is aggregated too.
+
+    Args:
+        how (str): aggregation method: "mean", "max", "min" or "last".
+
+    """
+    aggregations = {'mean': np.add, 'max': np.maximum, 'min': np.minimum}
+    if how not in aggregations and how != 'last':
+        raise ValueError(f"downsample method must be one of {list(aggregations) + ['last']}")
+    series = np.asarray(series)
+    if not len(series):
+        return series
+    starts = np.arange(0, len(series), factor)
+    if how == 'last':
+        return series[np.minimum(starts + factor, len(series)) - 1]
+    out = aggregations[how].reduceat(series, starts, axis=0)
+    if how == 'mean':
+        counts = np.diff(np.append(starts, len(series)))
+        out = out / counts.reshape((-1,) + (1,) * (series.ndim - 1))
+    return out
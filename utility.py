@@ -1,5 +1,11 @@
 import numpy as np
 
+# two-sided 95% quantiles of t distribution by degrees of freedom (used when scipy is not installed)
+T_TABLE_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+              10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+              18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+              26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
 
 def cost_calculator(vertiports: list, demands: list, aircraft_capacity: int) -> (float, float, float):
     """
@@ -16,6 +22,30 @@ def cost_calculator(vertiports: list, demands: list, aircraft_capacity: int) ->
         cost_per_demand (float): average flight cost of a successful demand.
         cost (float): average flight cost of an aircraft.
 
+    """
+    cost, number_of_aircraft = calc_cost(vertiports, aircraft_capacity)
+    satisfied_demands_percent, satisfied_demands = calc_satisfied_percent(demands)
+    if not satisfied_demands or not number_of_aircraft:
+        return cost, 0, 0
+    cost_per_demand = cost / satisfied_demands
+    cost_per_aircraft = cost / number_of_aircraft    
+    
+    return cost, cost_per_demand, cost_per_aircraft
+
+
+def calc_cost(vertiports: list, aircraft_capacity: int) -> (float, int):
+    """
+    This function calculate total cost of the network by using interpolation between flight hours 
+    and their respected operating cost.
+
+    Args:
+        vertiports (list): list of vertiport objects after simulation.
+        aircraft_capacity (int)
+
+    Returns:
+        cost (float): total flight cost of the network.
+        number_of_aircraft (int)
+
     """
     cost = 0
     number_of_aircraft = 0
@@ -38,13 +68,8 @@ def cost_calculator(vertiports: list, demands: list, aircraft_capacity: int) ->
         for aircraft in vertiport.aircrafts:
             cost_per_flight_hour = np.interp(aircraft.flight_hours, flight_hour_list, cost_list)
             cost += aircraft.flight_hours * cost_per_flight_hour
-    satisfied_demands_percent, satisfied_demands = calc_satisfied_percent(demands)
-    if not satisfied_demands or not number_of_aircraft:
-        return cost, 0, 0
-    cost_per_demand = cost / satisfied_demands
-    cost_per_aircraft = cost / number_of_aircraft    
     
-    return cost, cost_per_demand, cost_per_aircraft
+    return cost, number_of_aircraft
 
 
 def calc_satisfied_percent(demands: list) -> (float, int):
@@ -117,5 +142,36 @@ def calc_number_of_flights(vertiports: list) -> int:
     """
     number_of_flights = 0
     for vertiport in vertiports:
-        number_of_flights += len(vertiport.arriving_aircrafts)
-    return number_of_flights
\ No newline at end of file
+        number_of_flights += len(vertiport.arriving_aircrafts) + vertiport.released_arrivals
+    return number_of_flights
+
+
+def calc_number_of_diversions(vertiports: list) -> int:
+    """
+    This function calculates number of diversions (holding aircraft that went to another vertiport) 
+    in a simulation.
+
+    Args:
+        vertiports (list): list of vertiport objects after simulation.
+
+    Returns:
+        number_of_diversions (int)
+
+    """
+    number_of_diversions = 0
+    for vertiport in vertiports:
+        number_of_diversions += len(vertiport.diverted_aircrafts)
+    return number_of_diversions
+
+
+def t_quantile_95(degrees_of_freedom: int) -> float:
+    """
+    This function returns the two-sided 95% quantile of t distribution (from T_TABLE_95 with the
+    nearest smaller degrees of freedom if scipy is not installed).
+    """
+    try:
+        from scipy.stats import t
+    except ImportError:
+        smaller = [df for df in T_TABLE_95 if df <= degrees_of_freedom]
+        return T_TABLE_95[max(smaller)] if degrees_of_freedom <= 120 else 1.960
+    return float(t.ppf(0.975, degrees_of_freedom))